@@ -0,0 +1,237 @@
+"""
+Online backups of the TimeLogger database.
+
+A backup copies the live database with SQLite's backup API in steps of
+backup_pages_per_step pages, all read from one snapshot held by its own
+connection. In WAL mode that never blocks the app's writes, and writes that
+land mid-copy neither restart the copy nor end up in it. The copy is
+integrity-checked, gzip-compressed into backup_dir as
+timelog-YYYYmmdd-HHMMSS-ffffff.db.gz, and only the newest backup_keep files
+are kept.
+
+Run with:  python backup.py [create | list | restore FILE]
+"""
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+from datetime import datetime
+
+import config
+import snapshot
+from storage import BUSY_TIMEOUT_MS, restore_database
+
+PREFIX = 'timelog-'
+SUFFIX = '.db.gz'
+STAMP_FORMAT = '%Y%m%d-%H%M%S-%f'
+# pause between steps so a long copy leaves room for the app's own writes
+STEP_SLEEP = 0.005
+# how long stop() waits for a cancelled backup to clean up after itself
+STOP_TIMEOUT = 10
+
+
+class BackupError(Exception):
+    pass
+
+
+def _integrity_problem(conn):
+    """None if the database is sound, else a description of what's wrong."""
+    rows = conn.execute("PRAGMA integrity_check").fetchall()
+    if rows != [('ok',)]:
+        return "; ".join(r[0] for r in rows[:5])
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='timecards'").fetchone() is None:
+        return "no timecards table"
+    return None
+
+
+def list_backups(backup_dir=None):
+    """Backup files, newest first."""
+    backup_dir = backup_dir or config.BACKUP_DIR
+    try:
+        names = os.listdir(backup_dir)
+    except FileNotFoundError:
+        return []
+    names = [n for n in names if n.startswith(PREFIX) and n.endswith(SUFFIX)]
+    return [os.path.join(backup_dir, n) for n in sorted(names, reverse=True)]
+
+
+def backup_time(path):
+    """When a backup was taken, from its file name."""
+    stamp = os.path.basename(path)[len(PREFIX):-len(SUFFIX)]
+    return datetime.strptime(stamp, STAMP_FORMAT)
+
+
+def prune(keep=None, backup_dir=None):
+    """Delete all but the newest `keep` backups; returns the removed paths."""
+    keep = config.BACKUP_KEEP if keep is None else keep
+    removed = list_backups(backup_dir)[max(keep, 1):]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def create_backup(backup_dir=None, pages=None, progress=None, prune_old=True):
+    """
+    Copy, check and compress the live database; returns the backup's path.
+    progress(remaining, total) is called after each step; if it raises, the
+    copy is abandoned and the exception propagates. prune_old=False keeps
+    every older backup.
+    """
+    backup_dir = backup_dir or config.BACKUP_DIR
+    pages = pages or config.BACKUP_PAGES_PER_STEP
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.now().strftime(STAMP_FORMAT)
+    path = os.path.join(backup_dir, f"{PREFIX}{stamp}{SUFFIX}")
+    fd, tmp = tempfile.mkstemp(suffix='.db', dir=backup_dir)
+    os.close(fd)
+    try:
+        src = sqlite3.connect(config.DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000,
+                              isolation_level=None)
+        dest = sqlite3.connect(tmp)
+        try:
+            # pin one read snapshot for every step; otherwise each write from
+            # the app would send the copy back to page one
+            src.execute("BEGIN")
+            src.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+            src.backup(dest, pages=pages, sleep=STEP_SLEEP,
+                       progress=(lambda status, remaining, total: progress(remaining, total))
+                       if progress else None)
+            # the copy is a standalone file; don't leave it in WAL mode
+            dest.execute("PRAGMA journal_mode=DELETE")
+            problem = _integrity_problem(dest)
+        finally:
+            dest.close()
+            src.close()
+        if problem:
+            raise BackupError(f"backup failed its integrity check: {problem}")
+        with open(tmp, 'rb') as f_in, gzip.open(path + '.part', 'wb', compresslevel=6) as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        os.replace(path + '.part', path)
+    finally:
+        for leftover in (tmp, path + '.part'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    if prune_old:
+        prune(backup_dir=backup_dir)
+    return path
+
+
+def restore_backup(path):
+    """
+    Replace the live database with a backup after checking the backup's
+    integrity. The current database is backed up first, so a restore can
+    itself be undone.
+    """
+    fd, tmp = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    try:
+        try:
+            with gzip.open(path, 'rb') as f_in, open(tmp, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        except (OSError, EOFError) as ex:
+            raise BackupError(f"can't read {path}: {ex}")
+        src = sqlite3.connect(tmp)
+        try:
+            try:
+                problem = _integrity_problem(src)
+            except sqlite3.DatabaseError as ex:
+                problem = str(ex)
+            if problem:
+                raise BackupError(f"{os.path.basename(path)} failed its integrity check: {problem}")
+            if os.path.exists(config.DB_PATH):
+                # no pruning: the backup being restored may be the oldest kept
+                create_backup(prune_old=False)
+            restore_database(src)
+        finally:
+            src.close()
+    finally:
+        os.remove(tmp)
+    # the snapshot describes the old file
+    snapshot.invalidate()
+
+
+class BackupScheduler:
+    """
+    Background thread taking a backup whenever the newest one is older than
+    interval_hours. Results are kept in last_path / last_error for the GUI to
+    read; the thread never touches Tk.
+    """
+
+    def __init__(self, interval_hours=None):
+        self.interval = (config.BACKUP_INTERVAL_HOURS if interval_hours is None
+                         else interval_hours) * 3600
+        self.last_path = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='backup', daemon=True)
+
+    def start(self):
+        if self.interval > 0:
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Cancel any backup in progress and wait for it to remove its temp files."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _check_stop(self, remaining, total):
+        if self._stop.is_set():
+            raise BackupError("backup cancelled")
+
+    def _due_in(self):
+        """Seconds until the next backup is due."""
+        backups = list_backups()
+        if not backups:
+            return 0
+        try:
+            age = (datetime.now() - backup_time(backups[0])).total_seconds()
+        except ValueError:
+            return 0
+        return max(0, self.interval - age)
+
+    def _run(self):
+        while not self._stop.wait(self._due_in()):
+            try:
+                self.last_path = create_backup(progress=self._check_stop)
+                self.last_error = None
+            except (OSError, sqlite3.Error, BackupError) as ex:
+                self.last_error = str(ex)
+                # don't spin on a persistent failure
+                if self._stop.wait(min(self.interval, 3600)):
+                    break
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up or restore the TimeLogger database.")
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('create', help="take a backup now (default)")
+    sub.add_parser('list', help="list backups, newest first")
+    restore = sub.add_parser('restore', help="replace the database with a backup")
+    restore.add_argument('file')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'list':
+            for path in list_backups():
+                print(f"{path}  ({os.path.getsize(path) / 1024:.1f} KB)")
+        elif args.command == 'restore':
+            if not os.path.exists(args.file):
+                print(f"Error: backup not found at {args.file}")
+                sys.exit(1)
+            restore_backup(args.file)
+            print(f"Restored {config.DB_PATH} from {args.file}")
+        else:
+            print(f"Backup written to {create_backup()}")
+    except (BackupError, sqlite3.Error) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,15 @@ defaults = {
     "window_title": "WorkLogger 2.0",
     "theme": "clam",
     "payment_method_email": "spam@example.com",
+    "server_host": "127.0.0.1",
+    "server_port": 8765,
+    "profiling": False,  # hot-path timing, see profiling.py
+    "profile_dump": os.path.join(CONFIG_DIR, "profile.json"),  # written on exit
+    "backup_dir": os.path.join(CONFIG_DIR, "backups"),
+    "backup_keep": 7,  # newest compressed backups kept
+    "backup_interval_hours": 24,  # GUI background backups; 0 = off
+    "backup_pages_per_step": 1024,  # pages copied per backup step
+    "checkpoint_seconds": 300,  # how often a running shift's end is saved
     "ui": {
         "bg_color": "#121212",  # main background
         "fg_color": "#f2e7fe",  # main text
@@ -26,13 +35,12 @@ defaults = {
     }
 }
 
-# ensure config dir exists
-os.makedirs(CONFIG_DIR, exist_ok=True)
-
 
 # load or create config.json
 def load_config():
     if not os.path.exists(CONFIG_PATH):
+        # first run: only now is the config dir created
+        os.makedirs(CONFIG_DIR, exist_ok=True)
         with open(CONFIG_PATH, 'w') as f:
             json.dump(defaults, f, indent=2)
         return defaults
@@ -47,25 +55,56 @@ def load_config():
     return cfg
 
 
-CONFIG = load_config()
+_config = None
+
+
+def get_config():
+    """Load config.json on first call and cache it for the process."""
+    global _config
+    if _config is None:
+        _config = load_config()
+    return _config
+
+
+# top‑level constants, resolved from the config on first access
+_CONSTANTS = {
+    'RATE_PER_HOUR': lambda c: c['rate_per_hour'],
+    'NET_RATE': lambda c: c['net_rate'],
+    'DB_PATH': lambda c: c['db_path'],
+    'WINDOW_TITLE': lambda c: c['window_title'],
+    'THEME': lambda c: c['theme'],
+    # ui colors
+    'BG_COLOR': lambda c: c['ui']['bg_color'],
+    'FG_COLOR': lambda c: c['ui']['fg_color'],
+    'INVALID_COLOR': lambda c: c['ui']['invalid_color'],
+    'NO_DESC_COLOR': lambda c: c['ui']['no_desc_color'],
+    'CAL_BG': lambda c: c['ui']['cal_bg'],
+    'CAL_FG': lambda c: c['ui']['cal_fg'],
+    'TREE_BG': lambda c: c['ui']['tree_bg'],
+    'BUTTON_COLOR': lambda c: c['ui']['button_color'],
+    'PAYMENT_METHOD_EMAIL': lambda c: c['payment_method_email'],
+    # local API server
+    'SERVER_HOST': lambda c: c['server_host'],
+    'SERVER_PORT': lambda c: c['server_port'],
+    # profiling
+    'PROFILING': lambda c: c['profiling'],
+    'PROFILE_DUMP_PATH': lambda c: c['profile_dump'],
+    # backups
+    'BACKUP_DIR': lambda c: c['backup_dir'],
+    'BACKUP_KEEP': lambda c: c['backup_keep'],
+    'BACKUP_INTERVAL_HOURS': lambda c: c['backup_interval_hours'],
+    'BACKUP_PAGES_PER_STEP': lambda c: c['backup_pages_per_step'],
+    'CHECKPOINT_SECONDS': lambda c: c['checkpoint_seconds'],
+}
 
-# expose top‑level constants
-RATE_PER_HOUR = CONFIG['rate_per_hour']
-NET_RATE = CONFIG.get('net_rate', defaults['net_rate'])
-DB_PATH = CONFIG['db_path']
-WINDOW_TITLE = CONFIG['window_title']
-THEME = CONFIG['theme']
-# ui colors
-BG_COLOR = CONFIG['ui']['bg_color']
-FG_COLOR = CONFIG['ui']['fg_color']
-INVALID_COLOR = CONFIG['ui']['invalid_color']
-NO_DESC_COLOR = CONFIG['ui']['no_desc_color']
-CAL_BG = CONFIG['ui']['cal_bg']
-CAL_FG = CONFIG['ui']['cal_fg']
-TREE_BG = CONFIG['ui']['tree_bg']
-BUTTON_COLOR = CONFIG['ui']['button_color']
-PAYMENT_METHOD_EMAIL = CONFIG.get(
-    "payment_method_email",
-    defaults["payment_method_email"]
-)
 
+def __getattr__(name):
+    # importing this module touches neither the disk nor config.json;
+    # the first `config.X` / `from config import X` does, once
+    if name == 'CONFIG':
+        return get_config()
+    getter = _CONSTANTS.get(name)
+    if getter is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = globals()[name] = getter(get_config())
+    return value
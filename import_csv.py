@@ -0,0 +1,174 @@
+"""
+Script to import a CSV written by reporting.export_to_csv back into the
+TimeLogger v2 SQLite database (restore, or merge another person's export).
+
+Rows are parsed and validated in parallel chunks across worker processes:
+timestamp format, end not before start, a 0/1 valid flag, and duplicate
+entries (or, with --keep-ids, duplicate ids) within the chunk. A single writer then inserts the validated batches inside
+one transaction, skipping entries already in the database. Every rejected
+row is written, with its line number and reason, to a rejects CSV.
+
+Run with:  python import_csv.py FILE [--keep-ids] [--workers N] [--chunk-size N] [--rejects PATH]
+"""
+import argparse
+import csv
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from storage import import_transaction
+
+HEADER = ['id', 'start_time', 'end_time', 'valid', 'description']
+VALID_FLAGS = {'1': 1, '0': 0, 'true': 1, 'false': 0}
+TS_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def validate_chunk(chunk, keep_ids):
+    """
+    Validate [(line_no, fields)] and return (accepted, rejected):
+      accepted  [(line_no, (id, start_time, end_time, valid, description))]
+      rejected  [(line_no, reason, fields)]
+    Runs in a worker process.
+    """
+    accepted, rejected = [], []
+    seen = {}
+    seen_ids = {}
+    for line_no, fields in chunk:
+        if len(fields) != len(HEADER):
+            rejected.append((line_no, f"expected {len(HEADER)} columns, got {len(fields)}", fields))
+            continue
+        rid, start, end, valid, desc = fields
+        try:
+            rid = int(rid) if keep_ids else None
+        except ValueError:
+            rejected.append((line_no, f"invalid id: {rid!r}", fields))
+            continue
+        try:
+            dt_start = datetime.strptime(start, TS_FORMAT)
+            dt_end = datetime.strptime(end, TS_FORMAT)
+        except ValueError as ex:
+            rejected.append((line_no, f"invalid date/time: {ex}", fields))
+            continue
+        if dt_end < dt_start:
+            rejected.append((line_no, "end_time is before start_time", fields))
+            continue
+        flag = VALID_FLAGS.get(valid.strip().lower())
+        if flag is None:
+            rejected.append((line_no, f"invalid valid flag: {valid!r}", fields))
+            continue
+        key = (start, end)
+        if key in seen:
+            rejected.append((line_no, f"duplicate of line {seen[key]}", fields))
+            continue
+        if rid is not None and rid in seen_ids:
+            rejected.append((line_no, f"id {rid} repeats line {seen_ids[rid]}", fields))
+            continue
+        seen[key] = line_no
+        if rid is not None:
+            seen_ids[rid] = line_no
+        accepted.append((line_no, (rid, start, end, flag, desc)))
+    return accepted, rejected
+
+
+def _read_chunks(f, chunk_size):
+    """Yield [(line_no, fields)] chunks after checking the header."""
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header != HEADER:
+        raise ValueError(f"unexpected header {header!r}, expected {HEADER!r}")
+    chunk = []
+    for fields in reader:
+        if not fields:
+            continue
+        chunk.append((reader.line_num, fields))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _validated(chunks, keep_ids, workers):
+    """Validate chunks in order, keeping at most 2 * workers chunks in flight."""
+    if workers <= 1:
+        for chunk in chunks:
+            yield validate_chunk(chunk, keep_ids)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(validate_chunk, chunk, keep_ids))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def import_csv(path, keep_ids=False, workers=None, chunk_size=20000, rejects_path=None):
+    """
+    Import an export_to_csv file; returns (imported, rejected, rejects_path).
+    keep_ids restores the original ids instead of assigning new ones.
+    """
+    workers = workers or os.cpu_count() or 1
+    rejects_path = rejects_path or os.path.splitext(path)[0] + '.rejected.csv'
+    imported = 0
+    rejected = 0
+
+    try:
+        with open(path, newline='', encoding='utf-8') as f, \
+                open(rejects_path, 'w', newline='', encoding='utf-8') as rf:
+            rejects = csv.writer(rf)
+            rejects.writerow(['line', 'reason'] + HEADER)
+            with import_transaction(keep_ids) as importer:
+                for accepted, bad in _validated(_read_chunks(f, chunk_size), keep_ids, workers):
+                    lines = {row: line_no for line_no, row in accepted}
+                    skipped = importer.insert([row for _, row in accepted])
+                    imported += len(accepted) - len(skipped)
+                    for line_no, reason, fields in bad:
+                        rejects.writerow([line_no, reason] + list(fields))
+                    for row, reason in skipped:
+                        rejects.writerow([lines[row], reason, row[0] if keep_ids else '',
+                                          row[1], row[2], row[3], row[4]])
+                    rejected += len(bad) + len(skipped)
+    except Exception:
+        # nothing was committed, so a partial report would only mislead
+        os.remove(rejects_path)
+        raise
+
+    if not rejected:
+        os.remove(rejects_path)
+        rejects_path = None
+    return imported, rejected, rejects_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a TimeLogger CSV export.")
+    parser.add_argument('file')
+    parser.add_argument('--keep-ids', action='store_true',
+                        help="restore the original ids (for restoring a backup)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="validation processes (default: CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=20000)
+    parser.add_argument('--rejects', default=None,
+                        help="rejected-rows report (default: FILE.rejected.csv)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"Error: CSV file not found at {args.file}")
+        sys.exit(1)
+    try:
+        imported, rejected, rejects_path = import_csv(
+            args.file, args.keep_ids, args.workers, args.chunk_size, args.rejects)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Import complete: {imported} timecards added, {rejected} rejected.")
+    if rejects_path:
+        print(f"Rejected rows written to {rejects_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Load-test script for the TimeLogger API server (server.py).
+
+Spawns N concurrent clients that hammer a running server with a mix of month
+queries, totals and (optionally) card inserts, then reports throughput and
+latency percentiles. Writes go to whatever database the server uses, so point
+it at a scratch config/DB when testing with --write-ratio above zero.
+
+Run with:  python loadtest.py [--url URL] [--clients N] [--requests N] [--write-ratio R]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+
+from config import SERVER_HOST, SERVER_PORT
+
+
+def _call(base, method, path, body=None):
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = Request(base + path, data=data, method=method,
+                  headers={'Content-Type': 'application/json'})
+    with urlopen(req, timeout=30) as resp:
+        resp.read()
+        return resp.status
+
+
+def _random_request(rng, write_ratio):
+    now = datetime.now()
+    if rng.random() < write_ratio:
+        start = now - timedelta(days=rng.randint(0, 365), minutes=rng.randint(0, 1440))
+        end = start + timedelta(minutes=rng.randint(1, 480))
+        return 'POST', '/cards', {
+            'start_time': start.strftime('%Y-%m-%d %H:%M:%S'),
+            'end_time': end.strftime('%Y-%m-%d %H:%M:%S'),
+            'valid': True,
+            'description': 'loadtest',
+        }
+    path = rng.choice(['/cards', '/totals'])
+    month = rng.randint(1, 12)
+    return 'GET', f"{path}?year={now.year}&month={month}", None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def run(base, clients, requests_per_client, write_ratio):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(seed):
+        rng = random.Random(seed)
+        local_lat, local_err = [], []
+        for _ in range(requests_per_client):
+            method, path, body = _random_request(rng, write_ratio)
+            t0 = time.perf_counter()
+            try:
+                _call(base, method, path, body)
+            except (HTTPError, OSError) as ex:
+                local_err.append(f"{method} {path}: {ex}")
+            local_lat.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local_lat)
+            errors.extend(local_err)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"Requests:   {total} ({clients} clients x {requests_per_client})")
+    print(f"Errors:     {len(errors)}")
+    print(f"Elapsed:    {elapsed:.2f} s")
+    print(f"Throughput: {total / elapsed:.1f} req/s")
+    print(f"Latency:    p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+          f"p95 {percentile(latencies, 95) * 1000:.1f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.1f} ms")
+    for err in errors[:5]:
+        print(f"  {err}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the TimeLogger API server.")
+    parser.add_argument('--url', default=f"http://{SERVER_HOST}:{SERVER_PORT}")
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200, help="requests per client")
+    parser.add_argument('--write-ratio', type=float, default=0.0,
+                        help="fraction of requests that insert a card (default: read-only)")
+    args = parser.parse_args()
+    run(args.url.rstrip('/'), args.clients, args.requests, args.write_ratio)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Lightweight hot-path timing for TimeLogger.
+
+Wrap a function with @timed() (or a block with `with timer(name):`) and, while
+profiling is enabled, every call records its latency under that name. When
+disabled the wrapper costs one global lookup and a branch.
+
+capture_next() arms a one-shot cProfile run: the next timed call (outermost
+only) is profiled in full and its stats are saved to CONFIG_DIR.
+"""
+import atexit
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import config
+from config import CONFIG_DIR
+
+# samples kept per name for percentiles; counts and totals are exact
+MAX_SAMPLES = 2048
+
+_enabled = None  # None until the "profiling" setting is first read
+_armed = False
+_active = True  # _enabled or _armed; the only thing wrappers check
+_capturing = False
+_skip = frozenset()
+_stats = {}
+_lock = threading.Lock()
+
+last_capture = None  # (label, path, summary text) of the latest cProfile run
+
+
+class _Stat:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        self.samples.append(elapsed)
+
+
+def _refresh():
+    global _active
+    _active = bool(_enabled) or _armed
+
+
+def _resolve():
+    """Read the config setting on the first timed call, not at import."""
+    global _enabled
+    if _enabled is None:
+        _enabled = bool(config.PROFILING)
+        _refresh()
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = bool(on)
+    _refresh()
+
+
+def is_enabled():
+    _resolve()
+    return _enabled
+
+
+def reset():
+    """Forget everything recorded so far."""
+    with _lock:
+        _stats.clear()
+
+
+def capture_next(skip=()):
+    """Profile the next timed action with cProfile, ignoring names in `skip`."""
+    global _armed, _skip
+    _skip = frozenset(skip)
+    _armed = True
+    _refresh()
+
+
+def record(name, elapsed):
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = _Stat()
+        stat.add(elapsed)
+
+
+def _percentile(sorted_values, pct):
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def report():
+    """Per-name summary (times in milliseconds), slowest total first."""
+    with _lock:
+        items = [(name, s.count, s.total, s.max, sorted(s.samples)) for name, s in _stats.items()]
+    rows = []
+    for name, count, total, mx, samples in items:
+        rows.append({
+            'name': name,
+            'count': count,
+            'total_ms': total * 1000,
+            'mean_ms': total / count * 1000,
+            'p50_ms': _percentile(samples, 50) * 1000,
+            'p95_ms': _percentile(samples, 95) * 1000,
+            'p99_ms': _percentile(samples, 99) * 1000,
+            'max_ms': mx * 1000,
+        })
+    rows.sort(key=lambda r: r['total_ms'], reverse=True)
+    return rows
+
+
+def format_report():
+    rows = report()
+    if not rows:
+        return "No timings recorded."
+    lines = [f"{'name':<36}{'count':>7}{'total':>10}{'p50':>9}{'p95':>9}{'p99':>9}"]
+    for r in rows:
+        lines.append(f"{r['name'][:35]:<36}{r['count']:>7}{r['total_ms']:>10.1f}"
+                     f"{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}")
+    lines.append("(times in ms)")
+    return "\n".join(lines)
+
+
+def dump_json(path=None):
+    path = path or config.PROFILE_DUMP_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'written': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                   'timings': report()}, f, indent=2)
+
+
+def _run_capture(name, fn, args, kwargs):
+    """Run fn under cProfile and store the result next to the config."""
+    global _armed, _capturing, last_capture
+    _armed = False
+    _refresh()
+    _capturing = True
+    prof = cProfile.Profile()
+    try:
+        return prof.runcall(fn, *args, **kwargs)
+    finally:
+        _capturing = False
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        os.makedirs(CONFIG_DIR, exist_ok=True)
+        path = os.path.join(CONFIG_DIR, f"profile-{name.replace('.', '_')}-{stamp}.prof")
+        prof.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(prof, stream=out).sort_stats('cumulative').print_stats(15)
+        last_capture = (name, path, out.getvalue())
+
+
+def _call(name, fn, args, kwargs):
+    if _enabled is None:
+        _resolve()
+    if _armed and not _capturing and name not in _skip:
+        t0 = time.perf_counter()
+        try:
+            return _run_capture(name, fn, args, kwargs)
+        finally:
+            if _enabled:
+                record(name, time.perf_counter() - t0)
+    if not _enabled:
+        return fn(*args, **kwargs)
+    t0 = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        record(name, time.perf_counter() - t0)
+
+
+def timed(name=None):
+    """Decorator: record each call's latency under `name` (default: qualname)."""
+    def deco(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _active:
+                return fn(*args, **kwargs)
+            return _call(label, fn, args, kwargs)
+        return wrapper
+    return deco
+
+
+@contextmanager
+def timer(name):
+    """Context-manager form of @timed for ad-hoc blocks."""
+    if not _active:
+        yield
+        return
+    _resolve()
+    if not _enabled:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t0)
+
+
+@atexit.register
+def _dump_on_exit():
+    if _enabled and _stats and config.PROFILE_DUMP_PATH:
+        try:
+            dump_json()
+        except OSError:
+            pass
@@ -1,44 +1,174 @@
 import csv
+import calendar
+import os
+import shutil
+import tempfile
+import zipfile
 from datetime import datetime
 from matplotlib.backends.backend_pdf import PdfPages
 import matplotlib.pyplot as plt
-from storage import fetch_timecards
+import numpy as np
+import pandas as pd
+from openpyxl.styles import Font
+from storage import fetch_timecards, iter_row_batches, fetch_rates
+import snapshot
+import config
+from profiling import timed
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: columnar exports fall back to NumPy .npz
+    pa = pq = None
 
+# rows pulled from the cursor per record batch in columnar exports
+COLUMNAR_BATCH_ROWS = 10000
+ARROW_EXTENSIONS = ('.parquet', '.arrow', '.arrows')
+
+
+@timed('reporting.export_to_csv')
 def export_to_csv(filepath):
     """
-    Dump the entire timecards list to CSV:
+    Dump the entire timecards list to CSV, leaving out a shift still in
+    progress:
       id, start_time, end_time, valid, description
     """
-    cards = fetch_timecards()
-
     with open(filepath, 'w', newline='') as f:
         writer = csv.writer(f)
         # header matches table columns
         writer.writerow(['id', 'start_time', 'end_time', 'valid', 'description'])
-        for tc in cards:
-            writer.writerow([
-                tc.id,
-                tc.start_time,
-                tc.end_time,
-                int(tc.valid),
-                tc.description
-            ])
+        # rows come straight off the memory-mapped snapshot
+        for rid, start, end, valid, desc in snapshot.iter_rows():
+            writer.writerow([rid, start, end, int(valid), desc])
+
+
+@timed('reporting.export_columnar')
+def export_columnar(filepath, batch_size=COLUMNAR_BATCH_ROWS):
+    """
+    Dump the entire timecards list, minus a shift still in progress, in a
+    typed columnar format:
+      id int64, start_time/end_time int64 seconds, valid bool,
+      description dictionary-encoded
+    .parquet writes Parquet, .arrow an Arrow IPC file and .arrows an Arrow
+    IPC stream when pyarrow is installed; otherwise (or for .npz) a NumPy .npz is written
+    next to the requested name. Rows are streamed from the cursor in
+    batches, so memory stays bounded. Returns the path actually written.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    if pa is not None and ext in ARROW_EXTENSIONS:
+        _export_arrow(filepath, ext, batch_size)
+        return filepath
+    if ext != '.npz':
+        filepath = os.path.splitext(filepath)[0] + '.npz'
+    _export_npz(filepath, batch_size)
+    return filepath
+
+
+def _export_arrow(filepath, ext, batch_size):
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('start_time', pa.timestamp('s')),
+        ('end_time', pa.timestamp('s')),
+        ('valid', pa.bool_()),
+        ('description', pa.dictionary(pa.int32(), pa.string())),
+    ])
+    # the IPC file format allows one dictionary per field, so batches share
+    # codes and each adds its new descriptions as a delta; the stream format
+    # and Parquet let each batch carry its own
+    codes = {} if ext == '.arrow' else None
+    if ext == '.parquet':
+        writer = pq.ParquetWriter(filepath, schema)
+    elif ext == '.arrow':
+        writer = pa.ipc.new_file(filepath, schema,
+                                 options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+    else:
+        writer = pa.ipc.new_stream(filepath, schema)
+    try:
+        for rows in iter_row_batches(batch_size):
+            descriptions = [r[4] or '' for r in rows]
+            if codes is None:
+                description_col = pa.array(descriptions, pa.string()).dictionary_encode()
+            else:
+                description_col = pa.DictionaryArray.from_arrays(
+                    pa.array([codes.setdefault(d, len(codes)) for d in descriptions], pa.int32()),
+                    pa.array(list(codes), pa.string()))
+            writer.write_batch(pa.record_batch([
+                pa.array([r[0] for r in rows], pa.int64()),
+                pa.array([snapshot.to_epoch(r[1]) for r in rows], pa.timestamp('s')),
+                pa.array([snapshot.to_epoch(r[2]) for r in rows], pa.timestamp('s')),
+                pa.array([bool(r[3]) for r in rows], pa.bool_()),
+                description_col,
+            ], schema=schema))
+    finally:
+        writer.close()
+
 
+def _export_npz(filepath, batch_size):
+    """
+    .npz with one int64/bool/int32 array per column (description holds codes
+    into description_values). Each column is spooled to a temp file while
+    streaming, then copied into the archive behind a .npy header.
+    """
+    dtypes = {
+        'id': '<i8',
+        'start_time': '<i8',
+        'end_time': '<i8',
+        'valid': '|b1',
+        'description': '<i4',
+    }
+    codes = {}
+    count = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        spools = {name: open(os.path.join(tmp, name), 'wb') for name in dtypes}
+        try:
+            for rows in iter_row_batches(batch_size):
+                n = len(rows)
+                count += n
+                spools['id'].write(np.fromiter((r[0] for r in rows), '<i8', n).tobytes())
+                spools['start_time'].write(
+                    np.fromiter((snapshot.to_epoch(r[1]) for r in rows), '<i8', n).tobytes())
+                spools['end_time'].write(
+                    np.fromiter((snapshot.to_epoch(r[2]) for r in rows), '<i8', n).tobytes())
+                spools['valid'].write(np.fromiter((bool(r[3]) for r in rows), '?', n).tobytes())
+                spools['description'].write(np.fromiter(
+                    (codes.setdefault(r[4] or '', len(codes)) for r in rows), '<i4', n).tobytes())
+        finally:
+            for f in spools.values():
+                f.close()
+
+        # dict insertion order is code order
+        values = np.array(list(codes), dtype=str)
+        with zipfile.ZipFile(filepath, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for name, descr in dtypes.items():
+                with zf.open(name + '.npy', 'w', force_zip64=True) as out:
+                    np.lib.format.write_array_header_2_0(
+                        out, {'descr': descr, 'fortran_order': False, 'shape': (count,)})
+                    with open(os.path.join(tmp, name), 'rb') as f:
+                        shutil.copyfileobj(f, out)
+            with zf.open('description_values.npy', 'w', force_zip64=True) as out:
+                np.lib.format.write_array(out, values)
 
+
+@timed('reporting.generate_pdf_report')
 def generate_pdf_report(filepath, cards=None):
     """
-    PDF report: bar chart of hours per day, ignoring invalid entries.
+    PDF report: bar chart of hours per day, ignoring invalid entries and a
+    shift still in progress.
     """
-    raw = cards or fetch_timecards()
-    cards = [tc for tc in raw if tc.valid]
+    snap = None if cards else snapshot.current()
+    if snap is not None:
+        # whole history: aggregate straight from the snapshot columns
+        daily = snap.daily_hours()
+    else:
+        raw = cards or fetch_timecards()
+        cards = [tc for tc in raw if tc.valid and not tc.in_progress]
 
-    # Aggregate hours per date
-    daily = {}
-    for tc in cards:
-        date = datetime.strptime(tc.start_time, '%Y-%m-%d %H:%M:%S').date()
-        _, hrs = tc.duration_hours()
-        daily[date] = daily.get(date, 0) + hrs
+        # Aggregate hours per date
+        daily = {}
+        for tc in cards:
+            date = datetime.strptime(tc.start_time, '%Y-%m-%d %H:%M:%S').date()
+            _, hrs = tc.duration_hours()
+            daily[date] = daily.get(date, 0) + hrs
 
     dates = sorted(daily)
     hours = [daily[d] for d in dates]
@@ -54,3 +184,143 @@ def generate_pdf_report(filepath, cards=None):
     with PdfPages(filepath) as pdf:
         pdf.savefig(fig)
         plt.close(fig)
+
+
+def _rate_schedules(rates):
+    """{user_id: (effective_from datetime64[s], rate, net)} arrays per schedule."""
+    grouped = {}
+    for _, user_id, effective_from, rate, net in rates:
+        grouped.setdefault(user_id, []).append(
+            (effective_from, rate, config.NET_RATE if net is None else net))
+    return {uid: (np.array([e[0] for e in entries], dtype='datetime64[s]'),
+                  np.array([e[1] for e in entries], dtype=float),
+                  np.array([e[2] for e in entries], dtype=float))
+            for uid, entries in grouped.items()}
+
+
+def price_cards(cards, rates=None):
+    """
+    Price each card at the rate in effect when it started: the card's user's
+    own history, else the global history, else the configured rate.
+    Returns (hours, rate, net_rate) float arrays aligned with cards.
+
+    Every card is matched with one searchsorted per schedule, so repricing
+    years of history is a single vectorized pass instead of a lookup per card.
+    """
+    n = len(cards)
+    starts = np.array([tc.start_time for tc in cards], dtype='datetime64[s]')
+    ends = np.array([tc.end_time for tc in cards], dtype='datetime64[s]')
+    hours = (ends - starts).astype(np.int64) / 3600.0
+    rate = np.full(n, float(config.RATE_PER_HOUR))
+    net = np.full(n, float(config.NET_RATE))
+    if not n:
+        return hours, rate, net
+
+    schedules = _rate_schedules(fetch_rates() if rates is None else rates)
+    user_ids = np.array([-1 if tc.user_id is None else tc.user_id for tc in cards])
+    # global schedule first, then each user's own entries override it
+    for uid in sorted(schedules, key=lambda u: u is not None):
+        froms, rates_, nets = schedules[uid]
+        rows = np.arange(n) if uid is None else np.flatnonzero(user_ids == uid)
+        idx = np.searchsorted(froms, starts[rows], side='right') - 1
+        hit = idx >= 0
+        rate[rows[hit]] = rates_[idx[hit]]
+        net[rows[hit]] = nets[idx[hit]]
+    return hours, rate, net
+
+
+def compute_totals(cards, rate_per_hour=None):
+    """
+    Sum valid hours and pay for a list of cards, skipping a shift still in
+    progress:
+      returns (total_hours, gross_pay, net_pay)
+    Pay follows the rate history unless a flat rate_per_hour is given.
+    """
+    cards = [tc for tc in cards if tc.valid and not tc.in_progress]
+    hours, rate, net = price_cards(cards)
+    if rate_per_hour is not None:
+        rate = np.full(len(cards), float(rate_per_hour))
+    gross = hours * rate
+    return float(hours.sum()), float(gross.sum()), float((gross * net).sum())
+
+
+@timed('reporting.generate_xlsx_report')
+def generate_xlsx_report(filepath, cards, year, month, rate_per_hour=None):
+    """
+    XLSX report: one row per day of the given month plus a pay summary,
+    ignoring invalid entries and a shift still in progress. Pay follows the
+    rate history unless a flat rate_per_hour is given.
+    """
+    cards = [tc for tc in cards if tc.valid and not tc.in_progress]
+    hours, rates, nets = price_cards(cards)
+    if rate_per_hour is not None:
+        rates = np.full(len(cards), float(rate_per_hour))
+
+    # Aggregate hours & descriptions per date
+    daily_hours = {}
+    daily_desc = {}
+    for tc, hrs in zip(cards, hours):
+        date = datetime.strptime(tc.start_time, '%Y-%m-%d %H:%M:%S').date()
+        daily_hours[date] = daily_hours.get(date, 0) + hrs
+        if tc.description:
+            daily_desc.setdefault(date, []).append(tc.description)
+
+    last_day = calendar.monthrange(year, month)[1]
+
+    # Build every day of that month
+    full_days = [datetime(year, month, d).date() for d in range(1, last_day + 1)]
+
+    # Prepare rows with four columns: Date, Payment Method, Description, Hours
+    rows = []
+    for d in full_days:
+        hrs = round(daily_hours.get(d, 0), 2)
+        desc = "; ".join(daily_desc.get(d, []))
+        rows.append({
+            'Date': d.strftime('%Y-%m-%d'),
+            'Payment Method': config.PAYMENT_METHOD_EMAIL,
+            'Description': desc,
+            'Hours': hrs
+        })
+
+    # Add the summary block: one "Pay per Hour" line per rate that applied
+    rows.append({'Date': '', 'Payment Method': '', 'Description': '', 'Hours': ''})
+    rate_hours = {}
+    for r, hrs in zip(rates.tolist(), hours.tolist()):
+        rate_hours[r] = rate_hours.get(r, 0) + hrs
+    if not rate_hours:
+        rate_hours = {rate_per_hour if rate_per_hour is not None else config.RATE_PER_HOUR: 0}
+    for r, hrs in rate_hours.items():
+        note = f"{hrs:.2f} h at this rate" if len(rate_hours) > 1 else ''
+        rows.append({'Date': 'Pay per Hour', 'Payment Method': '', 'Description': note,
+                     'Hours': round(r, 2)})
+    total_hours = float(hours.sum())
+    gross = hours * rates
+    gross_pay = float(gross.sum())
+    net_pay = float((gross * nets).sum())
+    rows.extend([
+        {'Date': 'Total Hours', 'Payment Method': '', 'Description': '', 'Hours': round(total_hours, 2)},
+        {'Date': 'Gross Pay', 'Payment Method': '', 'Description': '', 'Hours': round(gross_pay, 2)},
+        {'Date': 'Net Pay', 'Payment Method': '', 'Description': '', 'Hours': round(net_pay, 2)},
+    ])
+
+    # Create DataFrame with correct column order
+    df = pd.DataFrame(rows, columns=['Date', 'Payment Method', 'Description', 'Hours'])
+
+    # Write to Excel
+    with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name='Summary')
+        worksheet = writer.sheets['Summary']
+
+        # Bold the header row
+        header_font = Font(bold=True)
+        for cell in worksheet[1]:
+            cell.font = header_font
+
+        # Auto‑size columns except "Description"
+        for col_cells in worksheet.columns:
+            header = col_cells[0].value
+            if header == 'Description':
+                # skip resizing this column
+                continue
+            max_length = max(len(str(cell.value)) for cell in col_cells)
+            worksheet.column_dimensions[col_cells[0].column_letter].width = max_length + 2
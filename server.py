@@ -0,0 +1,307 @@
+"""
+Local HTTP/JSON API for TimeLogger, so scripts and editors can clock in and out
+without the Tk GUI.
+
+All handlers go through the storage API, which shares one WAL-mode connection
+per process and serializes access to it, so concurrent clients never see
+"database is locked". Endpoints:
+
+    POST /clock-in                         start a session (persisted, shared with the GUI)
+    POST /clock-out                        finalize the session's card
+    GET  /cards[?year=Y&month=M]           list cards (all, or one month)
+    POST /cards                            add a card
+    PUT  /cards/<id>                       update a card
+    GET  /totals[?year=Y&month=M]          hours, gross and net pay
+    GET  /team-totals?year=Y&month=M[&by=client]
+                                           per-user (or per-client) totals
+    GET  /export.csv                       the whole DB as CSV
+    GET  /export.xlsx?year=Y&month=M       monthly XLSX report
+
+/cards and /totals also take user_id and client_id filters; clock-in and
+clock-out take an optional user_id in the body (one open session per user).
+
+Run with:  python server.py [--host HOST] [--port PORT]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from storage import init_db, log_timecard, fetch_timecards, fetch_timecards_for_month, update_timecard, TimeCard
+from storage import monthly_totals, open_session, close_session, find_open_session
+from storage import fetch_timecard, fetch_users, fetch_clients
+from config import SERVER_HOST, SERVER_PORT
+from reporting import export_to_csv, generate_xlsx_report, compute_totals
+
+TS_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def card_to_dict(tc):
+    return {
+        'id': tc.id,
+        'start_time': tc.start_time,
+        'end_time': tc.end_time,
+        'valid': bool(tc.valid),
+        'description': tc.description or '',
+        'user_id': tc.user_id,
+        'client_id': tc.client_id,
+        'in_progress': tc.in_progress,
+    }
+
+
+def _parse_card(data):
+    """Validate a JSON body and return (start, end, valid, description, user_id, client_id)."""
+    try:
+        start = data['start_time']
+        end = data['end_time']
+    except (KeyError, TypeError):
+        raise ApiError(400, "start_time and end_time are required")
+    try:
+        if datetime.strptime(end, TS_FORMAT) < datetime.strptime(start, TS_FORMAT):
+            raise ApiError(400, "end_time is before start_time")
+    except (TypeError, ValueError) as ex:
+        raise ApiError(400, f"Invalid date/time: {ex}")
+    return (start, end, bool(data.get('valid', True)), _description(data, ''),
+            *_owner_ids(data))
+
+
+def _description(data, default=None):
+    """The body's description, which must be a string when given."""
+    value = data.get('description', default)
+    if value is not None and not isinstance(value, str):
+        raise ApiError(400, "description must be a string")
+    return value
+
+
+def _owner_ids(data):
+    """(user_id, client_id) from a JSON body; each must be None or an existing id."""
+    ids = []
+    for key, known in (('user_id', fetch_users), ('client_id', fetch_clients)):
+        value = data.get(key)
+        if value is not None:
+            # bool is an int subclass, but never a sensible id
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise ApiError(400, f"{key} must be an integer")
+            if value not in {row[0] for row in known()}:
+                raise ApiError(400, f"No {key[:-3]} with id {value}")
+        ids.append(value)
+    return tuple(ids)
+
+
+def _month_params(query, required=False):
+    """Return (year, month) from the query string, or None if absent."""
+    if 'year' not in query and 'month' not in query and not required:
+        return None
+    try:
+        year = int(query['year'][0])
+        month = int(query['month'][0])
+    except (KeyError, ValueError):
+        raise ApiError(400, "year and month must both be integers")
+    if not 1 <= month <= 12:
+        raise ApiError(400, "month must be between 1 and 12")
+    return year, month
+
+
+def _owner_params(query):
+    """Optional (user_id, client_id) filters from the query string."""
+    try:
+        return tuple(int(query[k][0]) if k in query else None for k in ('user_id', 'client_id'))
+    except ValueError:
+        raise ApiError(400, "user_id and client_id must be integers")
+
+
+def _cards_for(query):
+    ym = _month_params(query)
+    owners = _owner_params(query)
+    return fetch_timecards(*owners) if ym is None else fetch_timecards_for_month(*ym, *owners)
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "TimeLoggerAPI/1.0"
+    protocol_version = "HTTP/1.1"
+
+    # --- plumbing ---
+    def log_message(self, fmt, *args):
+        # keep load tests and scripted use quiet
+        pass
+
+    def _send(self, status, body, content_type='application/json', filename=None):
+        if content_type == 'application/json':
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if filename:
+            self.send_header('Content-Disposition', f'attachment; filename="{filename}"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            data = json.loads(self.rfile.read(length))
+        except ValueError as ex:  # JSONDecodeError, or bytes that aren't UTF-8
+            raise ApiError(400, f"Invalid JSON: {ex}")
+        if not isinstance(data, dict):
+            raise ApiError(400, "JSON body must be an object")
+        return data
+
+    def _dispatch(self, routes):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split('/') if p]
+        query = parse_qs(url.query)
+        try:
+            # the body must always be drained to keep the connection usable
+            data = self._read_json() if self.command in ('POST', 'PUT') else None
+            for name, handler in routes:
+                if parts[:1] == [name]:
+                    status, body, *extra = handler(parts[1:], query, data)
+                    self._send(status, body, *extra)
+                    return
+            raise ApiError(404, f"No route for {self.command} {url.path}")
+        except ApiError as ex:
+            self._send(ex.status, {'error': str(ex)})
+        except Exception as ex:
+            # answer rather than drop the connection
+            self._send(500, {'error': f"Internal error: {ex}"})
+
+    def do_GET(self):
+        self._dispatch([
+            ('cards', self.get_cards),
+            ('totals', self.get_totals),
+            ('team-totals', self.get_team_totals),
+            ('export.csv', self.get_csv),
+            ('export.xlsx', self.get_xlsx),
+        ])
+
+    def do_POST(self):
+        self._dispatch([
+            ('clock-in', self.clock_in),
+            ('clock-out', self.clock_out),
+            ('cards', self.add_card),
+        ])
+
+    def do_PUT(self):
+        self._dispatch([
+            ('cards', self.put_card),
+        ])
+
+    # --- endpoints ---
+    def clock_in(self, rest, query, data):
+        data = data or {}
+        user_id, client_id = _owner_ids(data)
+        now = datetime.now().strftime(TS_FORMAT)
+        tc = TimeCard(now, now, description=_description(data, ''),
+                      user_id=user_id, client_id=client_id)
+        try:
+            open_session(tc)
+        except sqlite3.IntegrityError:
+            raise ApiError(409, "Already clocked in")
+        return 200, card_to_dict(tc)
+
+    def clock_out(self, rest, query, data):
+        data = data or {}
+        end = datetime.now().strftime(TS_FORMAT)
+        desc = _description(data)
+        user_id, _ = _owner_ids(data)
+        tc = find_open_session(user_id)
+        if tc is None or not close_session(tc.id, end, desc):
+            raise ApiError(409, "Not clocked in")
+        return 200, card_to_dict(fetch_timecard(tc.id))
+
+    def get_cards(self, rest, query, data):
+        if rest:
+            raise ApiError(404, "Use PUT to address a single card")
+        return 200, [card_to_dict(tc) for tc in _cards_for(query)]
+
+    def add_card(self, rest, query, data):
+        start, end, valid, desc, user_id, client_id = _parse_card(data)
+        tc = TimeCard(start, end, valid=valid, description=desc,
+                      user_id=user_id, client_id=client_id)
+        log_timecard(tc)
+        return 201, card_to_dict(tc)
+
+    def put_card(self, rest, query, data):
+        try:
+            tc_id = int(rest[0])
+        except (IndexError, ValueError):
+            raise ApiError(404, "PUT /cards/<id> needs a numeric id")
+        start, end, valid, desc, user_id, client_id = _parse_card(data)
+        if not update_timecard(tc_id, start, end, valid, desc, user_id, client_id):
+            raise ApiError(404, f"No timecard with id {tc_id}")
+        return 200, card_to_dict(fetch_timecard(tc_id))
+
+    def get_totals(self, rest, query, data):
+        hours, gross, net = compute_totals(_cards_for(query))
+        return 200, {'hours': round(hours, 2), 'gross': round(gross, 2), 'net': round(net, 2)}
+
+    def get_team_totals(self, rest, query, data):
+        year, month = _month_params(query, required=True)
+        by = query.get('by', ['user'])[0]
+        if by not in ('user', 'client'):
+            raise ApiError(400, "by must be 'user' or 'client'")
+        return 200, [{**r, 'hours': round(r['hours'], 2), 'gross': round(r['gross'], 2),
+                      'net': round(r['net'], 2)} for r in monthly_totals(year, month, by)]
+
+    def get_csv(self, rest, query, data):
+        return 200, _render_to_bytes('.csv', export_to_csv), 'text/csv', 'timelog.csv'
+
+    def get_xlsx(self, rest, query, data):
+        year, month = _month_params(query, required=True)
+        cards = fetch_timecards_for_month(year, month)
+        body = _render_to_bytes(
+            '.xlsx', lambda path: generate_xlsx_report(path, cards, year, month))
+        return (200, body,
+                'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                f'timelog-{year}-{month:02}.xlsx')
+
+
+def _render_to_bytes(suffix, writer):
+    """Run a path-based exporter into a temp file and return its contents."""
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    try:
+        writer(path)
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+def make_server(host=SERVER_HOST, port=SERVER_PORT):
+    init_db()
+    httpd = ThreadingHTTPServer((host, port), ApiHandler)
+    httpd.daemon_threads = True
+    return httpd
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the TimeLogger API over HTTP.")
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    args = parser.parse_args()
+
+    httpd = make_server(args.host, args.port)
+    print(f"TimeLogger API listening on http://{args.host}:{args.port}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Command-line clock for TimeLogger, sharing the persisted shift with the GUI
+and the API: a shift opened anywhere can be checked or closed here, e.g.
+after a crash.
+
+    status     show open shifts
+    in         clock in
+    out        clock out now
+    close      clock out at the last saved checkpoint (the shift ended unnoticed)
+
+Run with:  python session.py {status|in|out|close} [--user-id ID] [--client-id ID] [-m DESCRIPTION]
+"""
+import argparse
+import sqlite3
+import sys
+from datetime import datetime
+
+from storage import TimeCard, open_session, close_session, find_open_session, fetch_open_sessions
+
+TS_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clock in and out from the command line.")
+    parser.add_argument('command', choices=['status', 'in', 'out', 'close'])
+    parser.add_argument('--user-id', type=int, default=None)
+    parser.add_argument('--client-id', type=int, default=None)
+    parser.add_argument('-m', '--description', default=None)
+    args = parser.parse_args()
+    now = datetime.now().strftime(TS_FORMAT)
+
+    if args.command == 'status':
+        sessions = fetch_open_sessions()
+        for tc in sessions:
+            print(f"#{tc.id} user {tc.user_id or '-'}: started {tc.start_time}, "
+                  f"last saved {tc.end_time}")
+        if not sessions:
+            print("Not clocked in.")
+        return
+
+    if args.command == 'in':
+        tc = TimeCard(now, now, description=args.description or '',
+                      user_id=args.user_id, client_id=args.client_id)
+        try:
+            open_session(tc)
+        except sqlite3.IntegrityError:
+            print("Error: already clocked in")
+            sys.exit(1)
+        print(f"Clocked in at {now}")
+        return
+
+    tc = find_open_session(args.user_id)
+    if tc is None:
+        print("Error: not clocked in")
+        sys.exit(1)
+    end = now if args.command == 'out' else tc.end_time
+    if not close_session(tc.id, end, args.description):
+        print("Error: the shift was clocked out elsewhere")
+        sys.exit(1)
+    hours = (datetime.strptime(end, TS_FORMAT)
+             - datetime.strptime(tc.start_time, TS_FORMAT)).total_seconds() / 3600
+    print(f"Clocked out at {end} ({hours:.2f} h)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+Memory-mapped columnar snapshot of the timecards table.
+
+The snapshot lives next to the database (timelog.db -> timelog.snap) and holds
+fixed-width arrays, so opening even a multi-year history is one mmap and a few
+memoryview casts; TimeCard objects are only built for the rows a view shows.
+
+Layout (native byte order, 8-byte aligned):
+
+    header   magic, version, row count, change counter, blob size,
+             live blob bytes, longest card in seconds
+    ids      int64[n]
+    starts   int64[n]   wall-clock seconds since 1970-01-01 (naive, as stored)
+    ends     int64[n]
+    offsets  int64[n]   description offset into the blob
+    lengths  int64[n]   description length in bytes
+    users    int64[n]   user_id, 0 = unassigned
+    clients  int64[n]   client_id, 0 = unassigned
+    valid    uint8[n]
+    running  uint8[n]   1 = shift still in progress (end is its last checkpoint)
+    blob     UTF-8 descriptions
+
+Rows are sorted by (start, id). The header's change counter is checked
+against storage.change_counter() on every read; when the database has moved
+on, only the rows changed or deleted since then are fetched and merged in.
+"""
+import calendar
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+import config
+from storage import TimeCard, change_counter, fetch_changes_since, fetch_timecards, fetch_timecards_for_month
+
+MAGIC = b'TLSNAP\x00\x00'
+FORMAT_VERSION = 3
+HEADER = struct.Struct('=8sI4xqqqqq8x')
+
+# merge changes in place below this share of the table; rebuild above it
+INCREMENTAL_LIMIT = 0.25
+# rebuild (compacting the blob) once dead description bytes outweigh live ones
+COMPACT_MIN_BYTES = 64 * 1024
+
+_EPOCH = datetime(1970, 1, 1)
+_current = None
+_lock = threading.Lock()
+
+
+def to_epoch(ts):
+    """'YYYY-MM-DD HH:MM:SS' -> naive wall-clock seconds since 1970-01-01."""
+    return calendar.timegm((int(ts[0:4]), int(ts[5:7]), int(ts[8:10]),
+                            int(ts[11:13]), int(ts[14:16]), int(ts[17:19])))
+
+
+def _from_epoch(sec):
+    return (_EPOCH + timedelta(seconds=sec)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def snapshot_path():
+    base, _ = os.path.splitext(config.DB_PATH)
+    return base + '.snap'
+
+
+class Snapshot:
+    """Read-only view over a snapshot file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            self._file.close()
+            raise
+        self._views = []
+        try:
+            self._map()
+        except Exception:
+            self.close()
+            raise
+
+    def _map(self):
+        mv = memoryview(self._mm)
+        self._views.append(mv)
+        if len(mv) < HEADER.size:
+            raise ValueError("snapshot too short")
+        (magic, version, n, self.rev, blob_len,
+         self.live_bytes, self.max_span) = HEADER.unpack_from(mv)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("not a snapshot file")
+        pos = HEADER.size
+        cols = []
+        for _ in range(7):
+            cols.append(mv[pos:pos + 8 * n].cast('q'))
+            pos += 8 * n
+        (self.ids, self.starts, self.ends, self.offsets, self.lengths,
+         self.users, self.clients) = cols
+        self.valid = mv[pos:pos + n]
+        self.running = mv[pos + n:pos + 2 * n]
+        pos = _align(pos + 2 * n)
+        self.blob = mv[pos:pos + blob_len]
+        if len(self.blob) != blob_len:
+            raise ValueError("snapshot truncated")
+        self._views.extend(cols + [self.valid, self.running, self.blob])
+        self.count = n
+
+    def close(self):
+        for v in reversed(self._views):
+            v.release()
+        self._views = []
+        self._mm.close()
+        self._file.close()
+
+    def __len__(self):
+        return self.count
+
+    # --- row access ---
+    def description(self, i):
+        off = self.offsets[i]
+        return bytes(self.blob[off:off + self.lengths[i]]).decode('utf-8')
+
+    def row(self, i):
+        """(id, start_time, end_time, valid, description) for row i."""
+        return (self.ids[i], _from_epoch(self.starts[i]), _from_epoch(self.ends[i]),
+                bool(self.valid[i]), self.description(i))
+
+    def card(self, i):
+        rid, s, e, v, d = self.row(i)
+        tc = TimeCard(s, e, v, d, self.users[i] or None, self.clients[i] or None)
+        tc.id = rid
+        tc.in_progress = bool(self.running[i])
+        return tc
+
+    def month_indices(self, year, month):
+        """Rows whose start OR end falls in the month, in start order."""
+        lo = calendar.timegm((year, month, 1, 0, 0, 0))
+        nxt = (year + 1, 1) if month == 12 else (year, month + 1)
+        hi = calendar.timegm((nxt[0], nxt[1], 1, 0, 0, 0))
+        a = bisect_left(self.starts, lo)
+        b = bisect_left(self.starts, hi)
+        # cards that started before the month can only reach into it
+        # if they started within max_span of its first second
+        early = [i for i in range(bisect_left(self.starts, lo - self.max_span), a)
+                 if lo <= self.ends[i] < hi]
+        return early + list(range(a, b))
+
+    def daily_hours(self):
+        """{date: hours} over valid, finished rows, keyed by start date."""
+        daily = {}
+        starts, ends, valid, running = self.starts, self.ends, self.valid, self.running
+        for i in range(self.count):
+            if valid[i] and not running[i]:
+                day = (_EPOCH + timedelta(seconds=starts[i])).date()
+                daily[day] = daily.get(day, 0) + (ends[i] - starts[i]) / 3600
+        return daily
+
+
+def _align(pos):
+    return (pos + 7) & ~7
+
+
+def _copy(col):
+    out = array('q')
+    out.frombytes(col.cast('B'))
+    return out
+
+
+def _write(path, rev, ids, starts, ends, offsets, lengths, users, clients, valid, running,
+           blob, live, max_span):
+    n = len(ids)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, n, rev, len(blob), live, max_span))
+        for col in (ids, starts, ends, offsets, lengths, users, clients):
+            f.write(col.tobytes())
+        f.write(bytes(valid))
+        f.write(bytes(running))
+        pos = HEADER.size + 58 * n
+        f.write(b'\0' * (_align(pos) - pos))
+        f.write(blob)
+    os.replace(tmp, path)
+
+
+def _build(path):
+    """Write a fresh snapshot from the whole table."""
+    rev, rows, _ = fetch_changes_since(None)
+    ids, starts, ends, offsets, lengths, users, clients = (array('q') for _ in range(7))
+    valid, running = bytearray(), bytearray()
+    blob = bytearray()
+    max_span = 0
+    for rid, s, e, v, d, u, cl, p in rows:
+        st, en = to_epoch(s), to_epoch(e)
+        raw = (d or '').encode('utf-8')
+        ids.append(rid)
+        starts.append(st)
+        ends.append(en)
+        offsets.append(len(blob))
+        lengths.append(len(raw))
+        users.append(u or 0)
+        clients.append(cl or 0)
+        valid.append(1 if v else 0)
+        running.append(1 if p else 0)
+        blob += raw
+        max_span = max(max_span, en - st)
+    _write(path, rev, ids, starts, ends, offsets, lengths, users, clients, valid, running,
+           blob, len(blob), max_span)
+
+
+def _merge(old, path):
+    """Fold rows changed since old.rev into a copy of old; False if a rebuild is better."""
+    rev, changed, deleted = fetch_changes_since(old.rev)
+    drop = set(deleted) | {r[0] for r in changed}
+    if len(drop) > max(32, old.count * INCREMENTAL_LIMIT):
+        return False
+
+    # C-level copies of the old columns; the old mapping is left untouched
+    ids, starts, ends, offsets, lengths, users, clients = (
+        _copy(col) for col in (old.ids, old.starts, old.ends, old.offsets, old.lengths,
+                               old.users, old.clients))
+    valid, running = bytearray(old.valid), bytearray(old.running)
+    blob = bytearray(old.blob)
+    live, max_span = old.live_bytes, old.max_span
+
+    if drop:
+        if len(drop) <= 32:
+            positions = []
+            for rid in drop:
+                try:
+                    positions.append(ids.index(rid))
+                except ValueError:
+                    pass  # inserted and deleted since the last snapshot
+        else:
+            positions = [i for i, rid in enumerate(ids) if rid in drop]
+        for pos in sorted(positions, reverse=True):
+            live -= lengths[pos]
+            for col in (ids, starts, ends, offsets, lengths, users, clients, valid, running):
+                del col[pos]
+
+    for rid, s, e, v, d, u, cl, p in changed:
+        st, en = to_epoch(s), to_epoch(e)
+        raw = (d or '').encode('utf-8')
+        pos = bisect_left(starts, st)
+        while pos < len(starts) and starts[pos] == st and ids[pos] < rid:
+            pos += 1
+        ids.insert(pos, rid)
+        starts.insert(pos, st)
+        ends.insert(pos, en)
+        offsets.insert(pos, len(blob))
+        lengths.insert(pos, len(raw))
+        users.insert(pos, u or 0)
+        clients.insert(pos, cl or 0)
+        valid.insert(pos, 1 if v else 0)
+        running.insert(pos, 1 if p else 0)
+        blob += raw
+        live += len(raw)
+        max_span = max(max_span, en - st)
+
+    if len(blob) - live > max(live, COMPACT_MIN_BYTES):
+        return False
+    if os.name == 'nt':
+        # Windows can't replace a file that is still mapped
+        old.close()
+    _write(path, rev, ids, starts, ends, offsets, lengths, users, clients, valid, running,
+           blob, live, max_span)
+    return True
+
+
+def current():
+    """
+    Return the Snapshot matching the database, building or refreshing it as
+    needed, or None if it can't be used (callers then read storage directly).
+    """
+    global _current
+    with _lock:
+        try:
+            counter = change_counter()
+            if _current is not None and _current.rev == counter:
+                return _current
+            path = snapshot_path()
+            if _current is None and os.path.exists(path):
+                try:
+                    _current = Snapshot(path)
+                except (ValueError, OSError):
+                    _current = None
+                if _current is not None and _current.rev == counter:
+                    return _current
+
+            # a counter that went backwards means a different database file
+            if _current is None or _current.rev > counter or not _merge(_current, path):
+                if _current is not None and os.name == 'nt':
+                    _current.close()
+                _build(path)
+            # on POSIX the old mapping stays valid for anyone still reading it
+            _current = Snapshot(path)
+            return _current
+        except (OSError, ValueError, sqlite3.Error):
+            _current = None
+            return None
+
+
+def invalidate():
+    """Forget and delete the snapshot, e.g. after the database file is replaced."""
+    global _current
+    with _lock:
+        if _current is not None:
+            _current.close()
+            _current = None
+        try:
+            os.remove(snapshot_path())
+        except FileNotFoundError:
+            pass
+
+
+def month_cards(year, month):
+    """TimeCards whose start OR end falls in the month, oldest first."""
+    snap = current()
+    if snap is None:
+        return fetch_timecards_for_month(year, month)
+    return [snap.card(i) for i in snap.month_indices(year, month)]
+
+
+def iter_rows():
+    """
+    Yield (id, start_time, end_time, valid, description) for every finished
+    card, oldest first; a shift still in progress is left out.
+    """
+    snap = current()
+    if snap is None:
+        for tc in fetch_timecards():
+            if not tc.in_progress:
+                yield tc.id, tc.start_time, tc.end_time, tc.valid, tc.description
+        return
+    running = snap.running
+    for i in range(len(snap)):
+        if not running[i]:
+            yield snap.row(i)
@@ -1,17 +1,180 @@
 import os
 import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
-from config import DB_PATH
+import config
+from profiling import timed
+
+# --- CONNECTION ---
+# one shared WAL-mode connection per process; _db_lock serializes its use so
+# the GUI thread and the API server's worker threads never step on each other
+BUSY_TIMEOUT_MS = 5000
+
+_conn = None
+_db_lock = threading.RLock()
+
+# --- SCHEMA ---
+# each entry upgrades the schema by one PRAGMA user_version step; opening the
+# DB runs only the steps it is missing, so an up-to-date file costs one PRAGMA
+_MIGRATIONS = [
+    # 1: the original v2 table (IF NOT EXISTS: pre-versioning files have it)
+    ("""
+        CREATE TABLE IF NOT EXISTS timecards (
+            id INTEGER PRIMARY KEY,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            valid INTEGER NOT NULL,
+            description TEXT
+        )
+    """,),
+    # 2: a DB-wide change counter plus per-row revisions and delete
+    #    tombstones, maintained by triggers so writes from any client count;
+    #    snapshot.py uses them to refresh incrementally
+    ("""
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    """,
+     "INSERT OR IGNORE INTO meta(key, value) VALUES('changes', 0)",
+     "ALTER TABLE timecards ADD COLUMN rev INTEGER NOT NULL DEFAULT 0",
+     "CREATE INDEX IF NOT EXISTS idx_timecards_rev ON timecards(rev)",
+     """
+        CREATE TABLE IF NOT EXISTS tombstones (
+            id INTEGER PRIMARY KEY,
+            rev INTEGER NOT NULL
+        )
+    """,
+     """
+        CREATE TRIGGER IF NOT EXISTS timecards_rev_insert AFTER INSERT ON timecards
+        BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'changes';
+            UPDATE timecards SET rev = (SELECT value FROM meta WHERE key = 'changes')
+            WHERE id = NEW.id;
+        END
+    """,
+     """
+        CREATE TRIGGER IF NOT EXISTS timecards_rev_update
+        AFTER UPDATE OF start_time, end_time, valid, description ON timecards
+        BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'changes';
+            UPDATE timecards SET rev = (SELECT value FROM meta WHERE key = 'changes')
+            WHERE id = NEW.id;
+        END
+    """,
+     """
+        CREATE TRIGGER IF NOT EXISTS timecards_rev_delete AFTER DELETE ON timecards
+        BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'changes';
+            INSERT OR REPLACE INTO tombstones(id, rev)
+            VALUES (OLD.id, (SELECT value FROM meta WHERE key = 'changes'));
+        END
+    """),
+    # 3: users and clients; existing cards stay unassigned (NULL)
+    ("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            rate_per_hour REAL
+        )
+    """,
+     """
+        CREATE TABLE IF NOT EXISTS clients (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    """,
+     "ALTER TABLE timecards ADD COLUMN user_id INTEGER REFERENCES users(id)",
+     "ALTER TABLE timecards ADD COLUMN client_id INTEGER REFERENCES clients(id)",
+     "CREATE INDEX IF NOT EXISTS idx_timecards_user_start ON timecards(user_id, start_time)",
+     "CREATE INDEX IF NOT EXISTS idx_timecards_client_start ON timecards(client_id, start_time)",
+     # let month queries use the index OR-optimization on both bounds
+     "CREATE INDEX IF NOT EXISTS idx_timecards_start ON timecards(start_time)",
+     "CREATE INDEX IF NOT EXISTS idx_timecards_end ON timecards(end_time)",
+     "DROP TRIGGER IF EXISTS timecards_rev_update",
+     """
+        CREATE TRIGGER timecards_rev_update
+        AFTER UPDATE OF start_time, end_time, valid, description, user_id, client_id ON timecards
+        BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'changes';
+            UPDATE timecards SET rev = (SELECT value FROM meta WHERE key = 'changes')
+            WHERE id = NEW.id;
+        END
+    """),
+    # 4: inserts that already carry a rev (bulk imports stamp one rev for the
+    #    whole batch and bump the counter once) skip the per-row trigger
+    ("DROP TRIGGER IF EXISTS timecards_rev_insert",
+     """
+        CREATE TRIGGER timecards_rev_insert AFTER INSERT ON timecards
+        WHEN NEW.rev = 0
+        BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'changes';
+            UPDATE timecards SET rev = (SELECT value FROM meta WHERE key = 'changes')
+            WHERE id = NEW.id;
+        END
+    """),
+    # 5: effective-dated pay rates (user_id NULL = everyone's default); a NULL
+    #    net_rate means the global net_rate. Users' fixed rates become their
+    #    opening entry
+    ("""
+        CREATE TABLE IF NOT EXISTS rates (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id),
+            effective_from TEXT NOT NULL,
+            rate_per_hour REAL NOT NULL,
+            net_rate REAL
+        )
+    """,
+     "CREATE INDEX IF NOT EXISTS idx_rates_user_from ON rates(user_id, effective_from)",
+     """
+        INSERT INTO rates(user_id, effective_from, rate_per_hour)
+        SELECT id, '0001-01-01 00:00:00', rate_per_hour FROM users
+        WHERE rate_per_hour IS NOT NULL
+    """),
+    # 6: the running shift is a card with in_progress = 1 from clock-in on,
+    #    at most one per user; the partial index makes finding it a seek
+    ("ALTER TABLE timecards ADD COLUMN in_progress INTEGER NOT NULL DEFAULT 0",
+     "CREATE UNIQUE INDEX IF NOT EXISTS idx_timecards_open "
+     "ON timecards(COALESCE(user_id, 0)) WHERE in_progress = 1"),
+]
+SCHEMA_VERSION = len(_MIGRATIONS)
+
+# effective_from of a schedule's opening entry
+RATES_BEGINNING = '0001-01-01 00:00:00'
+
+# --- QUERY CACHE ---
+# read-through LRU keyed by (query, range); bounded by entry count and by the
+# total number of cached rows so a multi-year "all" result can't grow unbounded.
+# Entries are valid for one value of the DB-wide change counter (_cache_rev):
+# this process's writes drop just the months they touch and move _cache_rev
+# on, while a counter moved by any other process empties the cache.
+CACHE_MAX_ENTRIES = 64
+CACHE_MAX_ROWS = 50000
+
+_cache = OrderedDict()
+_cache_rows = 0
+_cache_lock = threading.Lock()
+_cache_rev = None
+_cache_hits = 0
+_cache_misses = 0
 
 
 # --- MODEL ---
 class TimeCard:
-    def __init__(self, start_time, end_time, valid=True, description=""):
+    def __init__(self, start_time, end_time, valid=True, description="",
+                 user_id=None, client_id=None):
         self.start_time = start_time
         self.end_time = end_time
         self.valid = valid
         self.description = description
+        self.user_id = user_id
+        self.client_id = client_id
         self.id = None
+        # True on cards read back while their shift is still running; end_time
+        # is then the last checkpoint, not a clock-out
+        self.in_progress = False
 
     def duration_hours(self):
         start = datetime.strptime(self.start_time, '%Y-%m-%d %H:%M:%S')
@@ -20,62 +183,723 @@ class TimeCard:
         return delta, delta.total_seconds() / 3600
 
 
+def _bootstrap_schema(conn):
+    """Apply any migrations newer than the file's PRAGMA user_version."""
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    # take the write lock first so two processes can't migrate at once
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for step in _MIGRATIONS[version:]:
+            for stmt in step:
+                conn.execute(stmt)
+        if version < SCHEMA_VERSION:
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def get_connection():
+    """Return the shared connection, opening it (in WAL mode) on first use."""
+    global _conn
+    with _db_lock:
+        if _conn is None:
+            db_path = config.DB_PATH
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000,
+                                   check_same_thread=False)
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            _bootstrap_schema(conn)
+            _conn = conn
+        return _conn
+
+
+def close_connection():
+    """Close the shared connection; the next call reopens it."""
+    global _conn
+    with _db_lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+
+def restore_database(source):
+    """
+    Overwrite the database in place with the contents of `source` (an open
+    sqlite3 connection) via the backup API, then reopen it lazily; holding the
+    lock keeps every other thread of this process out until it's done.
+    """
+    with _db_lock:
+        close_connection()
+        dest = sqlite3.connect(config.DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000)
+        try:
+            source.backup(dest)
+        finally:
+            dest.close()
+        clear_cache()
+
+
+@contextmanager
+def _transaction():
+    """Hold the shared connection for one statement batch, committing on success."""
+    with _db_lock:
+        conn = get_connection()
+        with conn:
+            yield conn.cursor()
+
+
+def _read_counter(c):
+    c.execute("SELECT value FROM meta WHERE key = 'changes'")
+    return c.fetchone()[0]
+
+
+@contextmanager
+def _write_transaction():
+    """
+    _transaction() for writes to timecards. Yields (cursor, touched): add the
+    old and new timestamps of every card written to touched. The write lock is
+    taken up front (BEGIN IMMEDIATE) so the change counter read before and
+    after brackets exactly this transaction; the touched months are dropped
+    from the cache before the lock is released.
+    """
+    touched = set()
+    with _db_lock:
+        conn = get_connection()
+        with conn:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            before = _read_counter(c)
+            yield c, touched
+            after = _read_counter(c)
+        _cache_invalidate(before, after, {_month_of(ts) for ts in touched if ts})
+
+
 def init_db():
-    """Ensure the timecards table exists."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS timecards (
-            id INTEGER PRIMARY KEY,
-            start_time TEXT NOT NULL,
-            end_time TEXT NOT NULL,
-            valid INTEGER NOT NULL,
-            description TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+    """Ensure the database is open and its schema is current (idempotent)."""
+    get_connection()
 
 
-def log_timecard(tc: TimeCard):
-    """Insert a new TimeCard into the DB."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO timecards(start_time,end_time,valid,description) VALUES(?,?,?,?)",
-        (tc.start_time, tc.end_time, int(tc.valid), tc.description)
-    )
-    conn.commit()
-    conn.close()
-
-
-def fetch_timecards():
-    """Return all TimeCards, oldest first."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT id, start_time, end_time, valid, description FROM timecards ORDER BY start_time")
-    rows = c.fetchall()
-    conn.close()
+def _month_of(ts):
+    """(year, month) of a 'YYYY-MM-DD HH:MM:SS' timestamp."""
+    return int(ts[0:4]), int(ts[5:7])
+
+
+def _month_bounds(year, month):
+    """Half-open [first, next) timestamp strings covering a calendar month."""
+    nxt = (year + 1, 1) if month == 12 else (year, month + 1)
+    return (f"{year:04}-{month:02}-01 00:00:00",
+            f"{nxt[0]:04}-{nxt[1]:02}-01 00:00:00")
+
+
+def _cache_reset(rev):
+    global _cache_rows, _cache_rev
+    _cache.clear()
+    _cache_rows = 0
+    _cache_rev = rev
+
 
+def _cache_get(key, rev):
+    """Cached cards for key, or None; rev is the current change counter."""
+    global _cache_hits, _cache_misses
+    with _cache_lock:
+        if rev != _cache_rev:
+            # written to by someone else since the entries were read
+            _cache_reset(rev)
+        if key in _cache:
+            _cache.move_to_end(key)
+            _cache_hits += 1
+            return list(_cache[key])
+        _cache_misses += 1
+        return None
+
+
+def _cache_put(key, cards, rev):
+    """Cache cards read at change counter rev, unless the cache has moved on."""
+    global _cache_rows
+    if len(cards) > CACHE_MAX_ROWS:
+        return
+    with _cache_lock:
+        if rev != _cache_rev:
+            return
+        if key in _cache:
+            _cache_rows -= len(_cache.pop(key))
+        _cache[key] = list(cards)
+        _cache_rows += len(cards)
+        while len(_cache) > CACHE_MAX_ENTRIES or _cache_rows > CACHE_MAX_ROWS:
+            _, old = _cache.popitem(last=False)
+            _cache_rows -= len(old)
+
+
+def _cache_invalidate(before, after, months):
+    """
+    After a write that moved the counter from before to after: drop the "all"
+    results plus every month query in months, or everything if the cache
+    wasn't current when the write began.
+    """
+    global _cache_rows, _cache_rev
+    with _cache_lock:
+        if _cache_rev != before:
+            _cache_reset(after)
+            return
+        for key in list(_cache):
+            query, rng = key[0], key[1]
+            if query == 'all' or (query == 'month' and rng in months):
+                _cache_rows -= len(_cache.pop(key))
+        _cache_rev = after
+
+
+def clear_cache():
+    """Empty the query cache and reset its counters."""
+    global _cache_hits, _cache_misses
+    with _cache_lock:
+        _cache_reset(None)
+        _cache_hits = 0
+        _cache_misses = 0
+
+
+def cache_stats():
+    """Return hit/miss counters and current size of the query cache."""
+    with _cache_lock:
+        return {
+            'hits': _cache_hits,
+            'misses': _cache_misses,
+            'entries': len(_cache),
+            'rows': _cache_rows,
+        }
+
+
+_CARD_COLUMNS = "id, start_time, end_time, valid, description, user_id, client_id, in_progress"
+
+
+def _rows_to_cards(rows):
     cards = []
-    for rid, s, e, v, d in rows:
-        tc = TimeCard(s, e, bool(v), d)
+    for rid, s, e, v, d, u, cl, p in rows:
+        tc = TimeCard(s, e, bool(v), d, u, cl)
         tc.id = rid
+        tc.in_progress = bool(p)
         cards.append(tc)
     return cards
 
 
-def update_timecard(tc_id, start_time, end_time, valid, description):
-    """Update an existing TimeCard by ID."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute(
-        "UPDATE timecards SET start_time=?, end_time=?, valid=?, description=? WHERE id=?",
-        (start_time, end_time, int(valid), description, tc_id)
-    )
-    conn.commit()
-    conn.close()
+def _owner_filter(user_id, client_id):
+    """Extra WHERE clauses and params for the optional user/client filters."""
+    clauses, params = [], []
+    if user_id is not None:
+        clauses.append("user_id = ?")
+        params.append(user_id)
+    if client_id is not None:
+        clauses.append("client_id = ?")
+        params.append(client_id)
+    return clauses, params
+
+
+def _cached_cards(key, sql, params):
+    """
+    Cards for a cacheable query: from the cache while it matches the change
+    counter, else read in one transaction with the counter and cached.
+    """
+    with _db_lock:
+        conn = get_connection()
+        c = conn.cursor()
+        # an explicit read transaction keeps the counter and rows in step
+        c.execute("BEGIN")
+        try:
+            rev = _read_counter(c)
+            cards = _cache_get(key, rev)
+            if cards is None:
+                c.execute(sql, params)
+                cards = _rows_to_cards(c.fetchall())
+                # still under _db_lock, so no writer can invalidate in between
+                _cache_put(key, cards, rev)
+        finally:
+            conn.commit()
+    return cards
+
+
+@timed('storage.log_timecard')
+def log_timecard(tc: TimeCard):
+    """Insert a new TimeCard into the DB and set its id."""
+    with _write_transaction() as (c, touched):
+        c.execute(
+            "INSERT INTO timecards(start_time,end_time,valid,description,user_id,client_id) "
+            "VALUES(?,?,?,?,?,?)",
+            (tc.start_time, tc.end_time, int(tc.valid), tc.description, tc.user_id, tc.client_id)
+        )
+        tc.id = c.lastrowid
+        touched.update((tc.start_time, tc.end_time))
+
+
+@timed('storage.fetch_timecards')
+def fetch_timecards(user_id=None, client_id=None):
+    """Return all TimeCards (optionally for one user/client), oldest first."""
+    clauses, params = _owner_filter(user_id, client_id)
+    where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+    return _cached_cards(('all', None, user_id, client_id),
+                         f"SELECT {_CARD_COLUMNS} FROM timecards {where}ORDER BY start_time",
+                         params)
+
+
+@timed('storage.fetch_timecards_for_month')
+def fetch_timecards_for_month(year, month, user_id=None, client_id=None):
+    """
+    Return TimeCards whose start OR end falls in the given month, oldest
+    first, optionally limited to one user and/or client.
+    """
+    lo, hi = _month_bounds(year, month)
+    clauses, params = _owner_filter(user_id, client_id)
+    clauses.append("((start_time >= ? AND start_time < ?) OR (end_time >= ? AND end_time < ?))")
+    params.extend((lo, hi, lo, hi))
+    return _cached_cards(('month', (year, month), user_id, client_id),
+                         f"SELECT {_CARD_COLUMNS} FROM timecards "
+                         f"WHERE {' AND '.join(clauses)} ORDER BY start_time",
+                         params)
+
+
+def fetch_timecard(tc_id):
+    """The TimeCard with this id, or None."""
+    with _transaction() as c:
+        cards = _select_by_ids(c, [tc_id])
+    return cards[0] if cards else None
+
+
+@timed('storage.update_timecard')
+def update_timecard(tc_id, start_time, end_time, valid, description,
+                    user_id=None, client_id=None):
+    """
+    Update an existing TimeCard by ID; returns False if there is no such card.
+    user_id/client_id of None leave the card's current assignment alone.
+    """
+    with _write_transaction() as (c, touched):
+        # the old times decide which cached months currently hold this card
+        c.execute("SELECT start_time, end_time FROM timecards WHERE id=?", (tc_id,))
+        touched.update(c.fetchone() or ())
+        c.execute(
+            "UPDATE timecards SET start_time=?, end_time=?, valid=?, description=?, "
+            "user_id=COALESCE(?, user_id), client_id=COALESCE(?, client_id) WHERE id=?",
+            (start_time, end_time, int(valid), description, user_id, client_id, tc_id)
+        )
+        touched.update((start_time, end_time))
+        return c.rowcount > 0
+
+
+@timed('storage.open_session')
+def open_session(tc: TimeCard):
+    """
+    Persist a clock-in as an in-progress card (end_time = last checkpoint) and
+    set its id and in_progress flag. Raises sqlite3.IntegrityError if the user already has one open.
+    """
+    with _write_transaction() as (c, touched):
+        c.execute(
+            "INSERT INTO timecards(start_time,end_time,valid,description,user_id,client_id,"
+            "in_progress) VALUES(?,?,?,?,?,?,1)",
+            (tc.start_time, tc.end_time, int(tc.valid), tc.description, tc.user_id, tc.client_id)
+        )
+        tc.id = c.lastrowid
+        tc.in_progress = True
+        touched.update((tc.start_time, tc.end_time))
+
+
+def _advance_session(tc_id, end_time, close, description=None):
+    with _write_transaction() as (c, touched):
+        c.execute("SELECT start_time, end_time FROM timecards WHERE id=? AND in_progress=1",
+                  (tc_id,))
+        old = c.fetchone()
+        if old is None:
+            return False
+        c.execute("UPDATE timecards SET end_time=?, description=COALESCE(?, description), "
+                  "in_progress=? WHERE id=?",
+                  (end_time, description, 0 if close else 1, tc_id))
+        touched.update((*old, end_time))
+        return True
+
+
+@timed('storage.checkpoint_session')
+def checkpoint_session(tc_id, end_time):
+    """
+    Record that an open session was still running at end_time (one keyed
+    UPDATE); returns False if it has since been closed elsewhere.
+    """
+    return _advance_session(tc_id, end_time, close=False)
+
+
+@timed('storage.close_session')
+def close_session(tc_id, end_time, description=None):
+    """Finalize an open session in place; returns False if it wasn't open."""
+    return _advance_session(tc_id, end_time, close=True, description=description)
+
+
+def find_open_session(user_id=None):
+    """The user's in-progress card (user_id None = unassigned), or None."""
+    with _transaction() as c:
+        c.execute(f"SELECT {_CARD_COLUMNS} FROM timecards "
+                  "WHERE in_progress = 1 AND COALESCE(user_id, 0) = ?", (user_id or 0,))
+        cards = _rows_to_cards(c.fetchall())
+    return cards[0] if cards else None
+
+
+def fetch_open_sessions():
+    """Every in-progress card, newest first."""
+    with _transaction() as c:
+        # no ORDER BY, so the tiny partial index is read instead of the table
+        c.execute(f"SELECT {_CARD_COLUMNS} FROM timecards WHERE in_progress = 1")
+        cards = _rows_to_cards(c.fetchall())
+    return sorted(cards, key=lambda tc: tc.start_time, reverse=True)
+
+
+def _select_by_ids(c, ids):
+    """Cards for the given ids (chunked to stay under SQLite's variable limit)."""
+    ids = list(ids)
+    rows = []
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        c.execute(f"SELECT {_CARD_COLUMNS} FROM timecards "
+                  f"WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+        rows.extend(c.fetchall())
+    return _rows_to_cards(rows)
+
+
+@timed('storage.bulk_edit')
+def bulk_edit(ids, valid=None, shift=None, set_description=None,
+              append_description=None, delete=False):
+    """
+    Apply one bulk action to many cards in a single transaction:
+      valid               mark all valid (True) / invalid (False)
+      shift               timedelta added to start and end
+      set_description     replace the description
+      append_description  append to the description ('; ' separated)
+      delete              remove the cards
+    A shift still in progress is left alone; it only changes by clocking out.
+    Returns (pre_image, after): the cards as they were (pass pre_image to
+    restore_timecards to undo) and as they are now (empty when deleting).
+    """
+    with _write_transaction() as (c, touched):
+        before = [tc for tc in _select_by_ids(c, ids) if not tc.in_progress]
+        if delete:
+            c.executemany("DELETE FROM timecards WHERE id=?", [(tc.id,) for tc in before])
+            after = []
+        else:
+            after = []
+            for old in before:
+                tc = TimeCard(old.start_time, old.end_time, old.valid, old.description or "",
+                              old.user_id, old.client_id)
+                tc.id = old.id
+                if valid is not None:
+                    tc.valid = bool(valid)
+                if shift is not None:
+                    fmt = '%Y-%m-%d %H:%M:%S'
+                    tc.start_time = (datetime.strptime(tc.start_time, fmt) + shift).strftime(fmt)
+                    tc.end_time = (datetime.strptime(tc.end_time, fmt) + shift).strftime(fmt)
+                if set_description is not None:
+                    tc.description = set_description
+                if append_description:
+                    tc.description = "; ".join(d for d in (tc.description, append_description) if d)
+                after.append(tc)
+            c.executemany(
+                "UPDATE timecards SET start_time=?, end_time=?, valid=?, description=? WHERE id=?",
+                [(tc.start_time, tc.end_time, int(tc.valid), tc.description, tc.id) for tc in after]
+            )
+        touched.update(ts for tc in before + after for ts in (tc.start_time, tc.end_time))
+    return before, after
+
+
+@timed('storage.restore_timecards')
+def restore_timecards(cards):
+    """Write cards back exactly (re-creating deleted ones), in one transaction."""
+    with _write_transaction() as (c, touched):
+        c.executemany(
+            "INSERT INTO timecards(id, start_time, end_time, valid, description, user_id, client_id) "
+            "VALUES(?,?,?,?,?,?,?) "
+            "ON CONFLICT(id) DO UPDATE SET start_time=excluded.start_time, "
+            "end_time=excluded.end_time, valid=excluded.valid, description=excluded.description, "
+            "user_id=excluded.user_id, client_id=excluded.client_id",
+            [(tc.id, tc.start_time, tc.end_time, int(tc.valid), tc.description,
+              tc.user_id, tc.client_id) for tc in cards]
+        )
+        touched.update(ts for tc in cards for ts in (tc.start_time, tc.end_time))
+
+
+class _BatchImporter:
+    """Inserts validated batches inside the transaction held by import_transaction()."""
+
+    def __init__(self, cursor, keep_ids):
+        self.c = cursor
+        self.keep_ids = keep_ids
+        self.months = set()
+        # ids taken by earlier rows of this import, whichever batch they came in
+        self.ids = set()
+        # every imported row shares one rev; the counter is bumped once at the end
+        cursor.execute("SELECT value FROM meta WHERE key = 'changes'")
+        self.rev = cursor.fetchone()[0] + 1
+
+    def insert(self, rows):
+        """
+        Insert (id, start_time, end_time, valid, description) rows, skipping
+        any already in the DB (same start/end, or same id with keep_ids) and,
+        with keep_ids, any repeating an id from earlier in the import.
+        Returns [(row, reason)] for the rows that were skipped.
+        """
+        c = self.c
+        accepted, skipped = [], []
+        for row in rows:
+            c.execute("SELECT 1 FROM timecards WHERE start_time=? AND end_time=? LIMIT 1",
+                      (row[1], row[2]))
+            if c.fetchone():
+                skipped.append((row, "duplicate of an existing entry"))
+                continue
+            if self.keep_ids:
+                if row[0] in self.ids:
+                    skipped.append((row, f"id {row[0]} repeats an earlier row"))
+                    continue
+                c.execute("SELECT 1 FROM timecards WHERE id=?", (row[0],))
+                if c.fetchone():
+                    skipped.append((row, f"id {row[0]} already exists"))
+                    continue
+                self.ids.add(row[0])
+            accepted.append(row)
+        if self.keep_ids:
+            c.executemany("INSERT INTO timecards(id,start_time,end_time,valid,description,rev) "
+                          "VALUES(?,?,?,?,?,?)", [r + (self.rev,) for r in accepted])
+        else:
+            c.executemany("INSERT INTO timecards(start_time,end_time,valid,description,rev) "
+                          "VALUES(?,?,?,?,?)", [r[1:] + (self.rev,) for r in accepted])
+        for r in accepted:
+            self.months.add(r[1][:7])
+            self.months.add(r[2][:7])
+        return skipped
+
+    def finish(self):
+        if self.months:
+            self.c.execute("UPDATE meta SET value = ? WHERE key = 'changes'", (self.rev,))
+
+
+@contextmanager
+def import_transaction(keep_ids=False):
+    """
+    One write transaction for a bulk import; yields an importer whose
+    insert(rows) may be called once per validated batch. Everything is
+    committed together, or rolled back if the block raises.
+    """
+    # _write_transaction takes the write lock before the importer reads the
+    # counter, so no other process can commit in between and share its rev
+    with _write_transaction() as (c, touched):
+        importer = _BatchImporter(c, keep_ids)
+        yield importer
+        importer.finish()
+        touched.update(importer.months)
+
+
+def add_user(name, rate_per_hour=None):
+    """Create a user (rate None = use the global rate_per_hour); returns its id."""
+    with _transaction() as c:
+        c.execute("INSERT INTO users(name, rate_per_hour) VALUES(?, ?)", (name, rate_per_hour))
+        user_id = c.lastrowid
+        if rate_per_hour is not None:
+            c.execute("INSERT INTO rates(user_id, effective_from, rate_per_hour) VALUES(?, ?, ?)",
+                      (user_id, RATES_BEGINNING, rate_per_hour))
+        return user_id
+
+
+def fetch_users():
+    """Return [(id, name, rate_per_hour)], by name."""
+    with _transaction() as c:
+        c.execute("SELECT id, name, rate_per_hour FROM users ORDER BY name")
+        return c.fetchall()
+
+
+def add_client(name):
+    """Create a client; returns its id."""
+    with _transaction() as c:
+        c.execute("INSERT INTO clients(name) VALUES(?)", (name,))
+        return c.lastrowid
+
+
+def fetch_clients():
+    """Return [(id, name)], by name."""
+    with _transaction() as c:
+        c.execute("SELECT id, name FROM clients ORDER BY name")
+        return c.fetchall()
+
+
+@timed('storage.set_rate')
+def set_rate(rate_per_hour, effective_from, net_rate=None, user_id=None):
+    """
+    Record a pay rate taking effect at effective_from ('YYYY-MM-DD HH:MM:SS')
+    for one user, or for everyone when user_id is None; replaces an entry at
+    the same instant. net_rate=None is stored as NULL and follows the
+    configured net rate.
+
+    The first global entry also pins the configured rate as the opening one,
+    so history before it no longer follows later edits to config.json.
+    """
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    with _transaction() as c:
+        c.execute("SELECT 1 FROM rates WHERE user_id IS NULL LIMIT 1")
+        if c.fetchone() is None and effective_from != RATES_BEGINNING:
+            c.execute("INSERT INTO rates(user_id, effective_from, rate_per_hour, net_rate) "
+                      "VALUES(NULL, ?, ?, ?)",
+                      (RATES_BEGINNING, config.RATE_PER_HOUR, config.NET_RATE))
+        c.execute("DELETE FROM rates WHERE user_id IS ? AND effective_from = ?",
+                  (user_id, effective_from))
+        c.execute("INSERT INTO rates(user_id, effective_from, rate_per_hour, net_rate) "
+                  "VALUES(?, ?, ?, ?)", (user_id, effective_from, rate_per_hour, net_rate))
+        rate_id = c.lastrowid
+        if user_id is not None:
+            # users.rate_per_hour tracks the rate in effect today
+            c.execute("UPDATE users SET rate_per_hour = ("
+                      "  SELECT rate_per_hour FROM rates WHERE user_id = ? AND effective_from <= ? "
+                      "  ORDER BY effective_from DESC LIMIT 1) WHERE id = ?",
+                      (user_id, now, user_id))
+        return rate_id
+
+
+def delete_rate(rate_id):
+    """Remove one rate history entry; returns True if it existed."""
+    with _transaction() as c:
+        c.execute("DELETE FROM rates WHERE id = ?", (rate_id,))
+        return c.rowcount > 0
+
+
+def fetch_rates(user_id=None, everyone=True):
+    """
+    Return rate history as [(id, user_id, effective_from, rate_per_hour, net_rate)],
+    ordered by (user_id, effective_from) with the global schedule first.
+    everyone=False limits it to one user's schedule (the global one for None).
+    """
+    with _transaction() as c:
+        if everyone:
+            c.execute("SELECT id, user_id, effective_from, rate_per_hour, net_rate FROM rates "
+                      "ORDER BY user_id IS NOT NULL, user_id, effective_from")
+        else:
+            c.execute("SELECT id, user_id, effective_from, rate_per_hour, net_rate FROM rates "
+                      "WHERE user_id IS ? ORDER BY effective_from", (user_id,))
+        return c.fetchall()
+
+
+# the rate entry in effect for (user_id, ts, ts): the user's own schedule
+# first, then the global one; both are single index seeks
+_RATE_LOOKUP = (
+    "id = COALESCE("
+    "  (SELECT r.id FROM rates r WHERE r.user_id = ? AND r.effective_from <= ? "
+    "   ORDER BY r.effective_from DESC LIMIT 1),"
+    "  (SELECT r.id FROM rates r WHERE r.user_id IS NULL AND r.effective_from <= ? "
+    "   ORDER BY r.effective_from DESC LIMIT 1))"
+)
+
+
+def rate_at(timestamp, user_id=None):
+    """(rate_per_hour, net_rate) in effect for a user at timestamp."""
+    with _transaction() as c:
+        c.execute(f"SELECT rate_per_hour, COALESCE(net_rate, ?) FROM rates WHERE {_RATE_LOOKUP}",
+                  (config.NET_RATE, user_id, timestamp, timestamp))
+        row = c.fetchone()
+    return tuple(row) if row else (config.RATE_PER_HOUR, config.NET_RATE)
+
+
+@timed('storage.monthly_totals')
+def monthly_totals(year, month, by='user'):
+    """
+    Team-wide totals for a month in one grouped pass, grouped by 'user' or
+    'client'. Returns [{'id', 'name', 'hours', 'gross', 'net'}] over valid,
+    finished cards whose start OR end falls in the month; each card is priced
+    at the rate in effect when it started (the user's own history, then the
+    global one, then the configured rate). Unassigned cards are grouped under
+    id None.
+    """
+    if by not in ('user', 'client'):
+        raise ValueError(f"Unknown grouping: {by!r}")
+    lo, hi = _month_bounds(year, month)
+    group = "p.user_id, u.name" if by == 'user' else "p.client_id, cl.name"
+    with _transaction() as c:
+        c.execute(
+            "WITH priced AS ("
+            "  SELECT t.user_id, t.client_id, "
+            "    (strftime('%s', t.end_time) - strftime('%s', t.start_time)) / 3600.0 AS hours, "
+            "    COALESCE("
+            "      (SELECT r.id FROM rates r WHERE r.user_id = t.user_id "
+            "       AND r.effective_from <= t.start_time ORDER BY r.effective_from DESC LIMIT 1),"
+            "      (SELECT r.id FROM rates r WHERE r.user_id IS NULL "
+            "       AND r.effective_from <= t.start_time ORDER BY r.effective_from DESC LIMIT 1)"
+            "    ) AS rate_id "
+            "  FROM timecards t "
+            "  WHERE t.valid = 1 AND t.in_progress = 0 "
+            "    AND ((t.start_time >= ? AND t.start_time < ?) "
+            "    OR (t.end_time >= ? AND t.end_time < ?))) "
+            f"SELECT {group}, SUM(p.hours), "
+            "  SUM(p.hours * COALESCE(r.rate_per_hour, ?)), "
+            "  SUM(p.hours * COALESCE(r.rate_per_hour, ?) * COALESCE(r.net_rate, ?)) "
+            "FROM priced p "
+            "LEFT JOIN rates r ON r.id = p.rate_id "
+            "LEFT JOIN users u ON u.id = p.user_id "
+            "LEFT JOIN clients cl ON cl.id = p.client_id "
+            f"GROUP BY {group} ORDER BY 2",
+            (lo, hi, lo, hi, config.RATE_PER_HOUR, config.RATE_PER_HOUR, config.NET_RATE)
+        )
+        rows = c.fetchall()
+    return [{'id': gid, 'name': name, 'hours': hours or 0.0, 'gross': gross or 0.0,
+             'net': net or 0.0}
+            for gid, name, hours, gross, net in rows]
+
+
+def change_counter():
+    """Current value of the DB-wide change counter (bumped on every write)."""
+    with _transaction() as c:
+        c.execute("SELECT value FROM meta WHERE key = 'changes'")
+        return c.fetchone()[0]
+
+
+def fetch_changes_since(rev=None):
+    """
+    Read, in one consistent transaction:
+      (counter, rows changed after rev, ids deleted after rev)
+    Rows are (id, start_time, end_time, valid, description, user_id, client_id,
+    in_progress) ordered by start;
+    rev=None returns every row and no deletions.
+    """
+    with _db_lock:
+        conn = get_connection()
+        c = conn.cursor()
+        # an explicit read transaction keeps the counter and rows in step
+        c.execute("BEGIN")
+        try:
+            c.execute("SELECT value FROM meta WHERE key = 'changes'")
+            counter = c.fetchone()[0]
+            if rev is None:
+                c.execute(f"SELECT {_CARD_COLUMNS} FROM timecards "
+                          "ORDER BY start_time, id")
+                rows = c.fetchall()
+                deleted = []
+            else:
+                c.execute(f"SELECT {_CARD_COLUMNS} FROM timecards "
+                          "WHERE rev > ? ORDER BY start_time, id", (rev,))
+                rows = c.fetchall()
+                c.execute("SELECT id FROM tombstones WHERE rev > ?", (rev,))
+                deleted = [r[0] for r in c.fetchall()]
+        finally:
+            conn.commit()
+    return counter, rows, deleted
 
 
-# Initialize on import
-init_db()
+def iter_row_batches(batch_size=10000):
+    """
+    Yield every finished card as lists of (id, start_time, end_time, valid,
+    description) rows, oldest first, batch_size at a time; a shift still in
+    progress is left out. Uses its own read connection so a long export
+    streams from the cursor without holding the shared one.
+    """
+    get_connection()  # make sure the schema exists
+    conn = sqlite3.connect(config.DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        c = conn.execute("SELECT id, start_time, end_time, valid, description FROM timecards "
+                         "WHERE in_progress = 0 ORDER BY start_time, id")
+        while True:
+            rows = c.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
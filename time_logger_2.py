@@ -1,17 +1,23 @@
 import tkinter as tk
-from tkinter import messagebox, ttk, filedialog
-from datetime import datetime
-import pandas as pd
-from openpyxl.styles import Font
+from tkinter import messagebox, ttk, filedialog, simpledialog
+from datetime import datetime, timedelta
 import calendar
-
-from storage import init_db, log_timecard, fetch_timecards, update_timecard, TimeCard
-from config import RATE_PER_HOUR, NET_RATE, WINDOW_TITLE, THEME
-from config import BG_COLOR, FG_COLOR, INVALID_COLOR, NO_DESC_COLOR, TREE_BG, BUTTON_COLOR, CONFIG_DIR, PAYMENT_METHOD_EMAIL
-from reporting import export_to_csv, generate_pdf_report
-
-# ensure DB is ready
-init_db()
+import sqlite3
+
+from storage import log_timecard, fetch_timecards, fetch_timecards_for_month, update_timecard, TimeCard
+from storage import bulk_edit, restore_timecards
+from storage import cache_stats, add_user, fetch_users, add_client, fetch_clients, monthly_totals
+from storage import set_rate, delete_rate, fetch_rates, rate_at
+from storage import open_session, checkpoint_session, close_session, fetch_open_sessions
+from config import WINDOW_TITLE, THEME
+from config import BG_COLOR, FG_COLOR, INVALID_COLOR, NO_DESC_COLOR, TREE_BG, BUTTON_COLOR, CONFIG_DIR
+from config import CHECKPOINT_SECONDS
+import snapshot
+from backup import BackupScheduler, list_backups, backup_time
+from reporting import export_to_csv, export_columnar, generate_pdf_report, generate_xlsx_report
+from reporting import compute_totals
+import profiling
+from profiling import timed
 
 
 class WorkLoggerApp:
@@ -21,7 +27,7 @@ class WorkLoggerApp:
         self.root.configure(bg=BG_COLOR)
 
         # Hard‑code these to whatever fits your content:
-        self.root.geometry("600x380")
+        self.root.geometry("600x410")
         self.root.resizable(False, False)
 
         style = ttk.Style(root)
@@ -68,8 +74,13 @@ class WorkLoggerApp:
                   relief=[('pressed', 'flat'), ('!pressed', 'flat')])
 
         self.root.attributes("-topmost", True)
-        self.rate_per_hour = RATE_PER_HOUR
         self.start_time = None
+        # the running shift's in-progress card and when its end was last saved
+        self.session = None
+        self.last_checkpoint = None
+        self.view_filter = None
+        # (hours, gross, net) of the current view, recomputed only when it changes
+        self.view_totals = (0.0, 0.0, 0.0)
 
         self.build_header()
         self.build_filter_frame()
@@ -81,9 +92,13 @@ class WorkLoggerApp:
         # 2) then load that view
         self.apply_filter()
 
+        self.resume_session()
         self.update_clock()
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
+        # periodic compressed backups on a background thread (backup_interval_hours)
+        self.backups = BackupScheduler().start()
+
     def build_header(self):
         hdr = tk.Frame(self.root, bg=BG_COLOR)
         hdr.pack(fill='x', pady=5)
@@ -109,7 +124,22 @@ class WorkLoggerApp:
 
         self.info_btn.pack(side='right', padx=5)
 
-        # right‑side: pack in this order to get [Gross] [Info] [Net]
+        # Perf button: timing stats / one‑shot cProfile capture
+        self.perf_btn = tk.Button(
+            hdr,
+            text='Perf',
+            bg=TREE_BG,
+            fg=BUTTON_COLOR,
+            bd=0,
+            highlightthickness=0,
+            activebackground=BG_COLOR,
+            activeforeground=FG_COLOR,
+            command=self.show_profile
+        )
+
+        self.perf_btn.pack(side='right', padx=5)
+
+        # right‑side: pack in this order to get [Gross] [Net] [Perf] [Info]
         # 1. Net (so it ends up at the far right)
         self.net_lbl = tk.Label(hdr, bg=BG_COLOR, fg=FG_COLOR)
         self.net_lbl.pack(side='right', padx=10)
@@ -147,11 +177,113 @@ class WorkLoggerApp:
         )
         self.clear_btn.pack(side='left', expand=True, fill='x', padx=5)
 
+        # second row: who / for whom
+        frm2 = tk.Frame(self.root, bg=BG_COLOR)
+        frm2.pack(fill='x')
+
+        tk.Label(frm2, text="User:", bg=BG_COLOR, fg=FG_COLOR).pack(side='left', padx=5)
+        self.user_cb = ttk.Combobox(frm2, state='readonly', width=10)
+        self.user_cb.pack(side='left', padx=5)
+        self.user_cb.bind('<<ComboboxSelected>>', lambda e: self.apply_filter())
+
+        tk.Label(frm2, text="Client:", bg=BG_COLOR, fg=FG_COLOR).pack(side='left', padx=5)
+        self.client_cb = ttk.Combobox(frm2, state='readonly', width=10)
+        self.client_cb.pack(side='left', padx=5)
+        self.client_cb.bind('<<ComboboxSelected>>', lambda e: self.apply_filter())
+
+        self.add_user_btn = ttk.Button(
+            frm2, text="+ User", command=self.new_user,
+            style="Flat.TButton", takefocus=False
+        )
+        self.add_user_btn.pack(side='left', expand=True, fill='x', padx=5)
+
+        self.add_client_btn = ttk.Button(
+            frm2, text="+ Client", command=self.new_client,
+            style="Flat.TButton", takefocus=False
+        )
+        self.add_client_btn.pack(side='left', expand=True, fill='x', padx=5)
+
+        self.team_btn = ttk.Button(
+            frm2, text="Team", command=self.show_team_totals,
+            style="Flat.TButton", takefocus=False
+        )
+        self.team_btn.pack(side='left', expand=True, fill='x', padx=5)
+
+        self.rates_btn = ttk.Button(
+            frm2, text="Rates", command=lambda: RatesWindow(self),
+            style="Flat.TButton", takefocus=False
+        )
+        self.rates_btn.pack(side='left', expand=True, fill='x', padx=5)
+
+        self.load_owners()
+
+    def load_owners(self):
+        """(Re)fill the user/client selectors, keeping the current choice."""
+        self.users = {name: (uid, rate) for uid, name, rate in fetch_users()}
+        self.clients = {name: cid for cid, name in fetch_clients()}
+        for cb, names in ((self.user_cb, self.users), (self.client_cb, self.clients)):
+            current = cb.get()
+            cb.config(values=['All'] + list(names))
+            cb.set(current if current in names else 'All')
+
+    @property
+    def user_id(self):
+        entry = self.users.get(self.user_cb.get())
+        return entry[0] if entry else None
+
+    @property
+    def client_id(self):
+        return self.clients.get(self.client_cb.get())
+
+    def new_user(self):
+        name = simpledialog.askstring("Add User", "User name:", parent=self.root)
+        if not name or not name.strip():
+            return
+        rate = simpledialog.askfloat(
+            "Add User", "Pay per hour (blank = default):", parent=self.root)
+        try:
+            add_user(name.strip(), rate)
+        except sqlite3.IntegrityError:
+            messagebox.showerror("Error", f"User '{name.strip()}' already exists")
+            return
+        self.load_owners()
+        self.user_cb.set(name.strip())
+        self.apply_filter()
+
+    def new_client(self):
+        name = simpledialog.askstring("Add Client", "Client name:", parent=self.root)
+        if not name or not name.strip():
+            return
+        try:
+            add_client(name.strip())
+        except sqlite3.IntegrityError:
+            messagebox.showerror("Error", f"Client '{name.strip()}' already exists")
+            return
+        self.load_owners()
+        self.client_cb.set(name.strip())
+        self.apply_filter()
+
+    def show_team_totals(self):
+        """Popup with the selected month's totals per user, from one grouped query."""
+        try:
+            m = list(calendar.month_name).index(self.month_cb.get())
+            y = int(self.year_cb.get())
+        except ValueError:
+            return
+        rows = monthly_totals(y, m)
+        lines = [f"{r['name'] or '(unassigned)'}: {r['hours']:.2f} h, "
+                 f"gross ${r['gross']:.2f}, net ${r['net']:.2f}" for r in rows]
+        messagebox.showinfo(
+            f"Team Totals – {calendar.month_name[m]} {y}",
+            "\n".join(lines) or "No entries this month."
+        )
+
     def build_tree(self):
         cols = ('date', 'start time', 'end time', 'hours earned')
         self.tree = ttk.Treeview(self.root,
                                  columns=cols,
                                  show='headings',
+                                 selectmode='extended',
                                  style="Custom.Treeview")
         for c in cols:
             # make each column stretch to fill available space
@@ -172,6 +304,21 @@ class WorkLoggerApp:
         self.tree.tag_configure('invalid', foreground=INVALID_COLOR)
         self.tree.tag_configure('no_desc', foreground=NO_DESC_COLOR)
 
+        # bulk actions on the (multi‑)selection: right‑click menu, Ctrl+Z undo
+        self.undo_stack = []
+        self.bulk_menu = tk.Menu(self.root, tearoff=0)
+        self.bulk_menu.add_command(label="Mark Valid", command=lambda: self.bulk_action(valid=True))
+        self.bulk_menu.add_command(label="Mark Invalid", command=lambda: self.bulk_action(valid=False))
+        self.bulk_menu.add_command(label="Shift Times…", command=self.bulk_shift)
+        self.bulk_menu.add_command(label="Set Description…", command=lambda: self.bulk_describe(False))
+        self.bulk_menu.add_command(label="Append Description…", command=lambda: self.bulk_describe(True))
+        self.bulk_menu.add_command(label="Delete", command=self.bulk_delete)
+        self.bulk_menu.add_separator()
+        self.bulk_menu.add_command(label="Undo", command=self.undo_bulk)
+        self.tree.bind('<Button-3>', self._show_bulk_menu)  # Windows / Linux
+        self.tree.bind('<Button-2>', self._show_bulk_menu)  # macOS
+        self.root.bind('<Control-z>', lambda e: self.undo_bulk())
+
     def _on_mousewheel(self, event):
         # Windows and macOS: event.delta is positive on scroll up, negative on scroll down
         if hasattr(event, 'delta') and event.delta:
@@ -230,33 +377,150 @@ class WorkLoggerApp:
             mins, secs = divmod(rem, 60)
             elapsed_str = f"{hrs:02}:{mins:02}:{secs:02}"
             self.elapsed_lbl.config(text=f"Elapsed Time: {elapsed_str} (Logging)")
+            # the tick itself never writes; only every CHECKPOINT_SECONDS
+            if (now - self.last_checkpoint).total_seconds() >= CHECKPOINT_SECONDS:
+                self.checkpoint(now)
         else:
             self.elapsed_lbl.config(text="Elapsed Time: 00:00:00 (Not Logging)")
         self.update_earned()
         self.root.after(1000, self.update_clock)
 
+    @timed()
     def load_tree(self, cards=None):
         # remember current cards for export/report
         # if cards is None => load everything, otherwise use exactly what was passed
-        self.current_cards = fetch_timecards() if cards is None else cards
+        if cards is None:
+            self.current_cards = fetch_timecards()
+            self.view_filter = None
+        else:
+            self.current_cards = cards
 
         for i in self.tree.get_children():
             self.tree.delete(i)
         for tc in self.current_cards:
-            dt = datetime.strptime(tc.start_time, '%Y-%m-%d %H:%M:%S')
-            dur, hrs = tc.duration_hours()
-            tag = 'invalid' if not tc.valid else ('no_desc' if not tc.description else '')
-            self.tree.insert(
-                '', 'end', iid=str(tc.id),
-                values=(
-                    dt.date(),
-                    dt.time(),
-                    datetime.strptime(tc.end_time, '%Y-%m-%d %H:%M:%S').time(),
-                    f"{hrs:.2f}"
-                ),
-                tags=(tag,)
-            )
+            values, tag = self._row(tc)
+            self.tree.insert('', 'end', iid=str(tc.id), values=values, tags=(tag,))
+        self.retotal()
+
+    def retotal(self):
+        """Reprice the current view against the rate history (once per change, not per tick)."""
+        self.view_totals = compute_totals(self.current_cards)
+
+    def _row(self, tc):
+        """Treeview values and tag for one card."""
+        dt = datetime.strptime(tc.start_time, '%Y-%m-%d %H:%M:%S')
+        dur, hrs = tc.duration_hours()
+        tag = 'invalid' if not tc.valid else ('no_desc' if not tc.description else '')
+        values = (
+            dt.date(),
+            dt.time(),
+            datetime.strptime(tc.end_time, '%Y-%m-%d %H:%M:%S').time(),
+            f"{hrs:.2f}"
+        )
+        return values, tag
+
+    def _in_view(self, tc):
+        """Would the current filter show this card?"""
+        if self.view_filter is None:
+            return True
+        y, m, user_id, client_id = self.view_filter
+        if user_id is not None and tc.user_id != user_id:
+            return False
+        if client_id is not None and tc.client_id != client_id:
+            return False
+        return any(int(ts[0:4]) == y and int(ts[5:7]) == m for ts in (tc.start_time, tc.end_time))
+
+    def patch_tree(self, changed, removed_ids=()):
+        """Update just the affected rows in place instead of reloading the view."""
+        by_id = {tc.id: tc for tc in self.current_cards}
+        for rid in removed_ids:
+            by_id.pop(rid, None)
+            if self.tree.exists(str(rid)):
+                self.tree.delete(str(rid))
+        for tc in changed:
+            iid = str(tc.id)
+            if not self._in_view(tc):
+                by_id.pop(tc.id, None)
+                if self.tree.exists(iid):
+                    self.tree.delete(iid)
+                continue
+            by_id[tc.id] = tc
+            values, tag = self._row(tc)
+            if self.tree.exists(iid):
+                self.tree.item(iid, values=values, tags=(tag,))
+            else:
+                self.tree.insert('', 'end', iid=iid, values=values, tags=(tag,))
+
+        # keep the view in start order, moving only rows that are out of place
+        self.current_cards = sorted(by_id.values(), key=lambda t: t.start_time)
+        order = [str(tc.id) for tc in self.current_cards]
+        if list(self.tree.get_children('')) != order:
+            for idx, iid in enumerate(order):
+                self.tree.move(iid, '', idx)
+        self.retotal()
+
+    def _show_bulk_menu(self, event):
+        row = self.tree.identify_row(event.y)
+        # right‑clicking outside the selection selects just that row
+        if row and row not in self.tree.selection():
+            self.tree.selection_set(row)
+        self.bulk_menu.tk_popup(event.x_root, event.y_root)
+
+    def _selected_ids(self):
+        return [int(iid) for iid in self.tree.selection()]
+
+    def bulk_action(self, **action):
+        """Run one bulk edit over the selection and patch the view once."""
+        ids = self._selected_ids()
+        if not ids:
+            return
+        before, after = bulk_edit(ids, **action)
+        if before:
+            self.undo_stack = (self.undo_stack + [before])[-20:]
+            self.patch_tree(after, removed_ids=[tc.id for tc in before] if not after else ())
+        if len(before) < len(ids):
+            messagebox.showinfo("Shift Running",
+                                "The running shift was left unchanged; clock out first.")
+
+    def bulk_shift(self):
+        if not self.tree.selection():
+            return
+        text = simpledialog.askstring(
+            "Shift Times", "Shift by (+/-HH:MM, or minutes):", parent=self.root)
+        if not text:
+            return
+        try:
+            offset = parse_offset(text)
+        except ValueError:
+            messagebox.showerror("Error", f"Invalid offset: {text}")
+            return
+        self.bulk_action(shift=offset)
 
+    def bulk_describe(self, append):
+        if not self.tree.selection():
+            return
+        title = "Append Description" if append else "Set Description"
+        text = simpledialog.askstring(title, "Description:", parent=self.root)
+        if text is None:
+            return
+        if append:
+            self.bulk_action(append_description=text)
+        else:
+            self.bulk_action(set_description=text)
+
+    def bulk_delete(self):
+        n = len(self.tree.selection())
+        if n and messagebox.askyesno("Delete", f"Delete {n} selected entr{'y' if n == 1 else 'ies'}?"):
+            self.bulk_action(delete=True)
+
+    def undo_bulk(self):
+        if not self.undo_stack:
+            return
+        before = self.undo_stack.pop()
+        restore_timecards(before)
+        self.patch_tree(before)
+
+    @timed()
     def apply_filter(self):
         # figure out selected month & year
         try:
@@ -266,15 +530,11 @@ class WorkLoggerApp:
             return
 
         # include cards whose start OR end is in that month/year
-        filtered = []
-        for tc in fetch_timecards():
-            dt_start = datetime.strptime(tc.start_time, '%Y-%m-%d %H:%M:%S')
-            dt_end = datetime.strptime(tc.end_time, '%Y-%m-%d %H:%M:%S')
-            if (dt_start.year == y and dt_start.month == m) or \
-                    (dt_end.year == y and dt_end.month == m):
-                filtered.append(tc)
-
-        self.load_tree(filtered)
+        self.view_filter = (y, m, self.user_id, self.client_id)
+        if self.user_id is None and self.client_id is None:
+            self.load_tree(snapshot.month_cards(y, m))
+        else:
+            self.load_tree(fetch_timecards_for_month(y, m, self.user_id, self.client_id))
 
     def clear_filter(self):
         now = datetime.now()
@@ -283,6 +543,7 @@ class WorkLoggerApp:
         self.year_cb.set(str(now.year))
         self.apply_filter()
 
+    @timed()
     def sort_tree(self, col, reverse):
         data = [(self.tree.set(k, col), k) for k in self.tree.get_children('')]
         data.sort(reverse=reverse)
@@ -295,9 +556,13 @@ class WorkLoggerApp:
         if not sel:
             return
         tc_id = int(sel[0])
-        tc = next((t for t in fetch_timecards() if t.id == tc_id), None)
+        # the selected row is always part of the current view
+        tc = next((t for t in self.current_cards if t.id == tc_id), None)
         if not tc:
             return
+        if tc.in_progress:
+            messagebox.showinfo("Shift Running", "This shift is still running; clock out first.")
+            return
 
         win = tk.Toplevel(self.root)
         win.title("Edit Entry")
@@ -378,42 +643,93 @@ class WorkLoggerApp:
         save_btn.pack(side='left', expand=True, fill='x', padx=(0, 5))
         cancel_btn.pack(side='left', expand=True, fill='x', padx=(5, 0))
 
+    def set_logging_ui(self, logging):
+        """Disable the view controls while clocked in, re-enable them after."""
+        combo = 'disabled' if logging else 'readonly'
+        button = 'disabled' if logging else 'normal'
+        for cb in (self.month_cb, self.year_cb, self.user_cb, self.client_cb):
+            cb.config(state=combo)
+        for btn in (self.filter_btn, self.clear_btn, self.xlsx_btn, self.csv_btn, self.pdf_btn):
+            btn.config(state=button)
+        self.clock_btn.config(text="Clock Out" if logging else "Clock In")
+
     def start_logging(self):
-        self.start_time = datetime.now()
-        # disable controls while clocked in
-        self.month_cb.config(state='disabled')
-        self.year_cb.config(state='disabled')
-        self.filter_btn.config(state='disabled')
-        self.clear_btn.config(state='disabled')
-        self.xlsx_btn.config(state='disabled')
-        self.csv_btn.config(state='disabled')
-        self.pdf_btn.config(state='disabled')
+        now = datetime.now()
+        ts = now.strftime('%Y-%m-%d %H:%M:%S')
+        tc = TimeCard(ts, ts, user_id=self.user_id, client_id=self.client_id)
+        try:
+            open_session(tc)
+        except sqlite3.IntegrityError:
+            messagebox.showerror("Error", "A shift is already running for this user "
+                                          "(clocked in from another window or the API).")
+            return
+        self.session = tc
+        self.start_time = now
+        self.last_checkpoint = now
+        self.set_logging_ui(True)
+        self.patch_tree([tc])
+
+    def checkpoint(self, now):
+        """Save the running shift's end so a crash loses at most CHECKPOINT_SECONDS."""
+        ts = now.strftime('%Y-%m-%d %H:%M:%S')
+        self.last_checkpoint = now
+        if not checkpoint_session(self.session.id, ts):
+            self.session_closed_elsewhere()
+            return
+        self.session.end_time = ts
+        self.patch_tree([self.session])
+
+    def session_closed_elsewhere(self):
+        """The running shift was clocked out elsewhere (e.g. through the API or session.py)."""
+        self.session = None
+        self.start_time = None
+        self.set_logging_ui(False)
+        self.apply_filter()
+        messagebox.showinfo("Shift Closed",
+                            "This shift was already clocked out elsewhere; "
+                            "the entry shows the time recorded there.")
 
     def stop_logging(self):
         if not self.start_time:
             return
         end = datetime.now()
-        tc = TimeCard(self.start_time.strftime('%Y-%m-%d %H:%M:%S'),
-                      end.strftime('%Y-%m-%d %H:%M:%S'))
-        log_timecard(tc)
+        if not close_session(self.session.id, end.strftime('%Y-%m-%d %H:%M:%S')):
+            self.session_closed_elsewhere()
+            return
         self.load_tree()
+        self.session = None
         self.start_time = None
-        # re‑enable controls once stopped
-        self.month_cb.config(state='readonly')
-        self.year_cb.config(state='readonly')
-        self.filter_btn.config(state='normal')
-        self.clear_btn.config(state='normal')
-        self.xlsx_btn.config(state='normal')
-        self.csv_btn.config(state='normal')
-        self.pdf_btn.config(state='normal')
+        self.set_logging_ui(False)
+
+    def resume_session(self):
+        """Pick up a shift left open by a crash or a closed window (one index seek)."""
+        sessions = fetch_open_sessions()
+        if not sessions:
+            return
+        tc = sessions[0]
+        if not messagebox.askyesno(
+                "Open Shift",
+                f"A shift started {tc.start_time} is still open "
+                f"(last saved {tc.end_time}).\n\n"
+                "Yes: keep logging it\nNo: clock out at the last saved time"):
+            close_session(tc.id, tc.end_time)
+            self.apply_filter()
+            return
+        # show the shift under its own user/client
+        names = {uid: name for name, (uid, _) in self.users.items()}
+        self.user_cb.set(names.get(tc.user_id, 'All'))
+        self.client_cb.set(next((n for n, cid in self.clients.items() if cid == tc.client_id), 'All'))
+        self.apply_filter()
+        self.session = tc
+        self.start_time = datetime.strptime(tc.start_time, '%Y-%m-%d %H:%M:%S')
+        self.last_checkpoint = datetime.now()
+        self.set_logging_ui(True)
 
     def toggle_logging(self):
         if not self.start_time:
             self.start_logging()
-            self.clock_btn.config(text="Clock Out")
         else:
             self.stop_logging()
-            self.clock_btn.config(text="Clock In")
 
     def generate_xlsx(self):
         # Ask where to save
@@ -425,74 +741,12 @@ class WorkLoggerApp:
         if not path:
             return
 
-        # Only valid entries from the current view
-        raw = self.current_cards
-        cards = [tc for tc in raw if tc.valid]
-
-        # Aggregate hours & descriptions per date
-        daily_hours = {}
-        daily_desc = {}
-        for tc in cards:
-            date = datetime.strptime(tc.start_time, '%Y-%m-%d %H:%M:%S').date()
-            _, hrs = tc.duration_hours()
-            daily_hours[date] = daily_hours.get(date, 0) + hrs
-            if tc.description:
-                daily_desc.setdefault(date, []).append(tc.description)
-
         # Determine selected month & year
         m = list(calendar.month_name).index(self.month_cb.get())
         y = int(self.year_cb.get())
-        last_day = calendar.monthrange(y, m)[1]
-
-        # Build every day of that month
-        full_days = [datetime(y, m, d).date() for d in range(1, last_day + 1)]
-
-        # Prepare rows with four columns: Date, Payment Method, Description, Hours
-        rows = []
-        for d in full_days:
-            hrs = round(daily_hours.get(d, 0), 2)
-            desc = "; ".join(daily_desc.get(d, []))
-            rows.append({
-                'Date': d.strftime('%Y-%m-%d'),
-                'Payment Method': PAYMENT_METHOD_EMAIL,
-                'Description': desc,
-                'Hours': hrs
-            })
-
-        # Add the summary block...
-        rows.append({'Date': '', 'Payment Method': '', 'Description': '', 'Hours': ''})
-        rows.append({'Date': 'Pay per Hour', 'Payment Method': '', 'Description': '', 'Hours': round(self.rate_per_hour, 2)})
-        total_hours = sum(daily_hours.values())
-        gross_pay = total_hours * self.rate_per_hour
-        net_pay = gross_pay * NET_RATE
-        rows.extend([
-            {'Date': 'Total Hours', 'Payment Method': '', 'Description': '', 'Hours': round(total_hours, 2)},
-            {'Date': 'Gross Pay', 'Payment Method': '', 'Description': '', 'Hours': round(gross_pay, 2)},
-            {'Date': 'Net Pay', 'Payment Method': '', 'Description': '', 'Hours': round(net_pay, 2)},
-        ])
 
-        # Create DataFrame with correct column order
-        df = pd.DataFrame(rows, columns=['Date', 'Payment Method', 'Description', 'Hours'])
-
-        # Write to Excel
-        with pd.ExcelWriter(path, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Summary')
-            workbook = writer.book
-            worksheet = writer.sheets['Summary']
-
-            # Bold the header row
-            header_font = Font(bold=True)
-            for cell in worksheet[1]:
-                cell.font = header_font
-
-            # Auto‑size columns except "Description"
-            for col_cells in worksheet.columns:
-                header = col_cells[0].value
-                if header == 'Description':
-                    # skip resizing this column
-                    continue
-                max_length = max(len(str(cell.value)) for cell in col_cells)
-                worksheet.column_dimensions[col_cells[0].column_letter].width = max_length + 2
+        # Only valid entries from the current view end up in the report
+        generate_xlsx_report(path, self.current_cards, y, m)
 
         messagebox.showinfo("Export Complete", f"XLSX report saved to:\n{path}")
 
@@ -502,13 +756,21 @@ class WorkLoggerApp:
     def export_csv(self):
         path = filedialog.asksaveasfilename(
             defaultextension='.csv',
-            filetypes=[('CSV Files', '*.csv')],
-            title='Save CSV Export'
+            filetypes=[('CSV Files', '*.csv'),
+                       ('Parquet Files', '*.parquet'),
+                       ('Arrow IPC File', '*.arrow'),
+                       ('Arrow IPC Stream', '*.arrows'),
+                       ('NumPy Archive', '*.npz')],
+            title='Save Database Export'
         )
         if not path:
             return
-        export_to_csv(path)
-        messagebox.showinfo("Export Complete", f"CSV exported to:\n{path}")
+        if path.lower().endswith('.csv'):
+            export_to_csv(path)
+        else:
+            # typed columnar export; may land as .npz without pyarrow
+            path = export_columnar(path)
+        messagebox.showinfo("Export Complete", f"Database exported to:\n{path}")
 
     def export_pdf_report(self):
         path = filedialog.asksaveasfilename(
@@ -521,38 +783,190 @@ class WorkLoggerApp:
         generate_pdf_report(path, self.current_cards)
         messagebox.showinfo("Report Complete", f"PDF report saved to:\n{path}")
 
+    @timed()
     def update_earned(self):
-        # Always use the filtered view (even if it's empty),
-        # only default to all cards if attribute isn't set yet.
-        cards = getattr(self, 'current_cards', [])
-        if cards is None:
-            cards = fetch_timecards()
-
-        total = sum(tc.duration_hours()[1] for tc in cards if tc.valid)
-        gross = total * self.rate_per_hour
-        net = gross * NET_RATE
+        # totals of the filtered view, kept current by retotal()
+        _, gross, net = self.view_totals
 
         self.gross_lbl.config(text=f"Gross: ${gross:.2f}")
         self.net_lbl.config(text=f"Net:   ${net:.2f}")
 
     def on_closing(self):
         if self.start_time:
-            messagebox.showwarning("Warning", "Stop logging first.")
-            return
+            # the shift stays open in the DB and is offered again on next start
+            checkpoint_session(self.session.id, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        self.backups.stop()
         self.root.destroy()
 
     def show_rates(self):
         """Display a popup with pay‑per‑hour and net‑rate details."""
-        # RATE_PER_HOUR is stored in self.rate_per_hour,
-        # NET_RATE is the fraction (e.g. 0.80)
-        pct = int(NET_RATE * 100)
+        # today's rate for the selected user; net_rate is a fraction (e.g. 0.80)
+        rate, net_rate = rate_at(datetime.now().strftime('%Y-%m-%d %H:%M:%S'), self.user_id)
+        pct = int(net_rate * 100)
+        stats = cache_stats()
+        backups = list_backups()
+        last = backup_time(backups[0]).strftime('%Y-%m-%d %H:%M') if backups else "never"
+        if self.backups.last_error:
+            last += f" (last attempt failed: {self.backups.last_error})"
         messagebox.showinfo(
             "Program Details",
-            f"Pay per hour: ${self.rate_per_hour:.2f}\n"
+            f"Pay per hour: ${rate:.2f}\n"
             f"Net rate: {pct}% of gross\n"
-            f"Working Directory: {CONFIG_DIR}"
+            f"Working Directory: {CONFIG_DIR}\n"
+            f"Query cache: {stats['hits']} hits / {stats['misses']} misses\n"
+            f"Last backup: {last}"
         )
 
+    def show_profile(self):
+        """Display timing stats for the hot paths, with profiling controls."""
+        win = tk.Toplevel(self.root)
+        win.title("Performance")
+        win.configure(bg=BG_COLOR)
+        win.attributes("-topmost", True)
+
+        text = tk.Text(win, width=82, height=18,
+                       bg=TREE_BG, fg=FG_COLOR,
+                       font=('Courier', 9), relief='flat')
+        text.pack(fill='both', expand=True, padx=10, pady=(10, 0))
+
+        def refresh():
+            state = "enabled" if profiling.is_enabled() else "disabled"
+            body = f"Timing is {state}.\n\n{profiling.format_report()}"
+            if profiling.last_capture:
+                name, path, summary = profiling.last_capture
+                body += f"\n\nLast cProfile capture: {name}\n{path}\n{summary}"
+            text.config(state='normal')
+            text.delete('1.0', 'end')
+            text.insert('1.0', body)
+            text.config(state='disabled')
+            toggle_btn.config(text="Disable" if profiling.is_enabled() else "Enable")
+
+        def toggle():
+            profiling.enable(not profiling.is_enabled())
+            refresh()
+
+        def capture():
+            # the clock tick calls update_earned every second; skip it so the
+            # capture lands on the next thing the user actually does
+            profiling.capture_next(skip=('WorkLoggerApp.update_earned',))
+            messagebox.showinfo("Profiling", "The next action will be profiled.", parent=win)
+
+        def reset():
+            profiling.reset()
+            refresh()
+
+        btn_frame = tk.Frame(win, bg=BG_COLOR, pady=10)
+        btn_frame.pack(fill='x', padx=10)
+        toggle_btn = tk.Button(btn_frame, command=toggle,
+                               bg=BUTTON_COLOR, fg=BG_COLOR,
+                               bd=0, highlightthickness=0, relief='flat')
+        buttons = [
+            toggle_btn,
+            tk.Button(btn_frame, text="Capture Next Action", command=capture,
+                      bg=BUTTON_COLOR, fg=BG_COLOR,
+                      bd=0, highlightthickness=0, relief='flat'),
+            tk.Button(btn_frame, text="Refresh", command=refresh,
+                      bg=BUTTON_COLOR, fg=BG_COLOR,
+                      bd=0, highlightthickness=0, relief='flat'),
+            tk.Button(btn_frame, text="Reset", command=reset,
+                      bg=BUTTON_COLOR, fg=BG_COLOR,
+                      bd=0, highlightthickness=0, relief='flat'),
+        ]
+        for b in buttons:
+            b.pack(side='left', expand=True, fill='x', padx=5)
+        refresh()
+
+
+def parse_offset(text):
+    """'+1:30', '-0:15' or '90' (minutes) -> timedelta."""
+    text = text.strip()
+    sign = -1 if text.startswith('-') else 1
+    text = text.lstrip('+-')
+    if ':' in text:
+        hrs, mins = text.split(':', 1)
+        minutes = int(hrs) * 60 + int(mins)
+    else:
+        minutes = int(text)
+    return timedelta(minutes=sign * minutes)
+
+
+class RatesWindow:
+    """Rate history of the selected user (or the global default) with add/delete."""
+
+    def __init__(self, app: WorkLoggerApp):
+        self.app = app
+        self.user_id = app.user_id
+        who = app.user_cb.get() if self.user_id is not None else "Default"
+        self.win = tk.Toplevel(app.root)
+        self.win.title(f"Rates – {who}")
+        self.win.configure(bg=BG_COLOR)
+        self.win.transient(app.root)
+        self.win.grab_set()
+
+        frm = tk.Frame(self.win, bg=BG_COLOR, padx=10, pady=10)
+        frm.pack(fill='both', expand=True)
+
+        self.listbox = tk.Listbox(frm, width=48, height=8,
+                                  bg=TREE_BG, fg=FG_COLOR, relief='flat',
+                                  font=('Courier', 9))
+        self.listbox.grid(row=0, column=0, columnspan=2, pady=(0, 8))
+
+        fields = (("Effective From:", datetime.now().strftime('%Y-%m-%d 00:00:00')),
+                  ("Pay per Hour:", ''),
+                  ("Net Rate (%):", ''))
+        self.vars = []
+        for row, (label, value) in enumerate(fields, start=1):
+            tk.Label(frm, text=label, bg=BG_COLOR, fg=FG_COLOR)\
+                .grid(row=row, column=0, sticky='e', pady=2)
+            var = tk.StringVar(value=value)
+            tk.Entry(frm, textvariable=var, width=25,
+                     bg=TREE_BG, fg=FG_COLOR, insertbackground=FG_COLOR,
+                     relief='flat')\
+                .grid(row=row, column=1, sticky='w', pady=2)
+            self.vars.append(var)
+
+        btn_frame = tk.Frame(self.win, bg=BG_COLOR, pady=10)
+        btn_frame.pack(fill='x', padx=10)
+        for text, cmd in (("Add", self.add), ("Delete Selected", self.delete),
+                          ("Close", self.win.destroy)):
+            tk.Button(btn_frame, text=text, command=cmd,
+                      bg=BUTTON_COLOR, fg=BG_COLOR,
+                      bd=0, highlightthickness=0, relief='flat')\
+                .pack(side='left', expand=True, fill='x', padx=5)
+        self.refresh()
+
+    def refresh(self):
+        self.rates = fetch_rates(self.user_id, everyone=False)
+        self.listbox.delete(0, 'end')
+        for _, _, effective_from, rate, net in self.rates:
+            since = "beginning" if effective_from.startswith('0001-') else effective_from
+            pct = "default" if net is None else f"{net * 100:.0f}%"
+            self.listbox.insert('end', f"{since:<20} ${rate:>8.2f}  net {pct}")
+
+    def add(self):
+        effective_from, rate, pct = (v.get().strip() for v in self.vars)
+        try:
+            datetime.strptime(effective_from, '%Y-%m-%d %H:%M:%S')
+            rate = float(rate)
+            net_rate = float(pct) / 100 if pct else None
+        except ValueError as ex:
+            messagebox.showerror("Error", f"Invalid rate: {ex}", parent=self.win)
+            return
+        set_rate(rate, effective_from, net_rate, self.user_id)
+        self.changed()
+
+    def delete(self):
+        sel = self.listbox.curselection()
+        if not sel:
+            return
+        delete_rate(self.rates[sel[0]][0])
+        self.changed()
+
+    def changed(self):
+        self.refresh()
+        self.app.load_owners()
+        self.app.retotal()
+
 
 class AddEntryWindow:
     def __init__(self, app: WorkLoggerApp):
@@ -646,7 +1060,9 @@ class AddEntryWindow:
 
         tc = TimeCard(s, e,
                       valid=self.valid_var.get(),
-                      description=self.desc_text.get('1.0', 'end-1c'))
+                      description=self.desc_text.get('1.0', 'end-1c'),
+                      user_id=self.app.user_id,
+                      client_id=self.app.client_id)
         log_timecard(tc)
         self.app.load_tree()
         messagebox.showinfo("Added", "New entry saved")